@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import logging
 import re
@@ -6,8 +7,20 @@ import sqlite3
 import secrets
 import string
 import asyncio
-from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
+import atexit
+import bisect
+import heapq
+import threading
+import time
+from datetime import datetime, time as clock_time
+from functools import lru_cache, wraps
+from typing import Dict, Any, List, Tuple, Optional, FrozenSet, Set
+from urllib.parse import urlparse
+
+try:
+    import orjson  # optional: faster content.json parsing
+except ImportError:
+    orjson = None
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -31,13 +44,80 @@ DATA_FILE = "content.json"
 BOT_USERNAME_DEFAULT = "PandoraAI_FAQ_bot"
 DB_PATH_DEFAULT = "/data/referrals.db"
 
+# Resolved once: the environment does not change while the bot is running
+DB_PATH = (os.environ.get("REFERRAL_DB_PATH") or DB_PATH_DEFAULT).strip()
+BOT_VERSION = (os.environ.get("BOT_VERSION") or "1.0.0").strip()
+
+# Create the database directory up front so any connection (even before db_init) can open the file
+if os.path.dirname(DB_PATH):
+    try:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not create database directory for {DB_PATH}: {e}")
+
+# Section dividers for the admin reports
+REPORT_DIVIDER = "═" * 35
+REPORT_RULE = "─" * 35
+
+# Rule line framing section titles on the stats screens, and the wider one on progress messages
+SECTION_RULE = "━" * 15
+PROGRESS_RULE = "━" * 22
+
+
+def build_ui_labels(content: Dict[str, Any]) -> Dict[str, str]:
+    """Flatten a content block's "ui" section into the labels ui_get can return as-is."""
+    ui = content.get("ui", {})
+    if not isinstance(ui, dict):
+        return {}
+    return {sys.intern(k): v for k, v in ui.items() if isinstance(v, str) and v.strip()}
+
+
+# Parsed content.json, reused until the file's mtime changes
+_content_cache: Dict[str, Any] = {"mtime_ns": None, "data": None}
+
 
 def load_all_content() -> Dict[str, Any]:
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Return the parsed content file, re-reading it only when it has changed on disk.
+
+    The returned dict is shared between handlers and must not be mutated.
+    """
+    mtime_ns = os.stat(DATA_FILE).st_mtime_ns
+    if _content_cache["data"] is not None and _content_cache["mtime_ns"] == mtime_ns:
+        return _content_cache["data"]
+
+    all_content = _parse_content_file()
+    _content_cache["mtime_ns"] = mtime_ns
+    _content_cache["data"] = all_content
+    return all_content
+
+
+def _parse_content_file() -> Dict[str, Any]:
+    if orjson is not None:
+        with open(DATA_FILE, "rb") as f:
+            all_content = orjson.loads(f.read())
+    else:
+        with open(DATA_FILE, "r", encoding="utf-8") as f:
+            all_content = json.load(f)
+
+    # Precompute the label map and FAQ search index for every language block once per load
+    languages = all_content.get("languages", {})
+    if isinstance(languages, dict):
+        for block in languages.values():
+            if isinstance(block, dict):
+                block["_ui_labels"] = build_ui_labels(block)
+                block["_kb_cache"] = {}
+                add_faq_search_data(block)
+    all_content["_ui_labels"] = build_ui_labels(all_content)
+    all_content["_kb_cache"] = {}
+    all_content["_default_lang"] = get_default_lang(all_content)
+    add_faq_search_data(all_content)
+    return all_content
 
 
 def get_default_lang(all_content: Dict[str, Any]) -> str:
+    cached = all_content.get("_default_lang")
+    if cached:
+        return cached
     default_lang = (all_content.get("default_lang") or "en").strip().lower()
     languages = all_content.get("languages", {})
     if isinstance(languages, dict) and default_lang in languages:
@@ -71,27 +151,140 @@ def get_active_content(context: ContextTypes.DEFAULT_TYPE, all_content: Dict[str
 
 
 def ui_get(content: Dict[str, Any], key: str, fallback: str) -> str:
-    ui = content.get("ui", {}) if isinstance(content.get("ui", {}), dict) else {}
-    value = ui.get(key)
-    return value if isinstance(value, str) and value.strip() else fallback
+    labels = content.get("_ui_labels")
+    if labels is None:
+        labels = build_ui_labels(content)
+    return labels.get(key, fallback)
+
+
+class SafeDict(dict):
+    """Mapping for str.format_map that leaves unknown placeholders untouched."""
+
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+def fill_template(template: str, **values: Any) -> str:
+    """Fill {placeholders} in a content template in a single pass.
+
+    Unknown placeholders are kept as-is. If the template contains stray braces
+    (e.g. a typo in content.json) fall back to plain replacement instead of failing.
+    """
+    try:
+        return template.format_map(SafeDict(values))
+    except (ValueError, IndexError, AttributeError):
+        for key, value in values.items():
+            template = template.replace("{" + key + "}", str(value))
+        return template
 
 
 def get_db_path() -> str:
-    return (os.environ.get("REFERRAL_DB_PATH") or DB_PATH_DEFAULT).strip()
+    return DB_PATH
+
+
+# Idle connections kept open for reuse (db_connect hands them out, close() returns them)
+DB_POOL_MAX_IDLE = 8
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-20000",
+)
+_db_pool: List["PooledConnection"] = []
+_db_pool_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() returns it to the pool instead of closing it."""
+
+    in_pool = False
+
+    def close(self) -> None:
+        if self.in_pool:
+            return
+        # Same effect as closing: uncommitted changes are discarded
+        if self.in_transaction:
+            self.rollback()
+        with _db_pool_lock:
+            if len(_db_pool) < DB_POOL_MAX_IDLE:
+                self.in_pool = True
+                _db_pool.append(self)
+                return
+        super().close()
+
+
+def close_db_pool() -> None:
+    """Close every idle pooled connection (registered to run at interpreter exit)."""
+    with _db_pool_lock:
+        while _db_pool:
+            sqlite3.Connection.close(_db_pool.pop())
+
+
+atexit.register(close_db_pool)
 
 
 def db_connect() -> sqlite3.Connection:
-    path = get_db_path()
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    conn = sqlite3.connect(path)
+    """Take a connection from the pool, or open a new one.
+
+    Pooled connections are opened with check_same_thread=False because a connection used
+    by one asyncio.to_thread() worker may be handed to another later. Each caller must
+    finish with it (commit or close) on the thread that took it; close() rolls back any
+    open transaction before returning it to the pool.
+    """
+    with _db_pool_lock:
+        if _db_pool:
+            conn = _db_pool.pop()
+            conn.in_pool = False
+            return conn
+
+    conn = sqlite3.connect(get_db_path(), factory=PooledConnection, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+# Columns added to users after the first release, in the order they were introduced
+USERS_MIGRATION_COLUMNS = (
+    ("step2_warning_ack", "INTEGER DEFAULT 0"),
+    ("last_seen_version", "TEXT DEFAULT '0.0.0'"),  # version tracking
+    ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),  # first interaction
+    ("progress_step", "INTEGER DEFAULT 0"),  # onboarding progress
+    ("progress_visited_sharing", "INTEGER DEFAULT 0"),
+    ("progress_shared_invite", "INTEGER DEFAULT 0"),
+    ("progress_visited_member_tools", "INTEGER DEFAULT 0"),
+    ("sponsor_confirmed", "INTEGER DEFAULT 0"),
+)
+
+# Secondary indexes for the team/growth/leaderboard lookups (created after migration)
+DB_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_users_sponsor_step1 ON users(sponsor_code, step1_confirmed)",
+    "CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)",
+)
+# Unique: one ref code per owner, and the conflict target of upsert_referrer (db_init fails without it)
+REFS_OWNER_UNIQUE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS uq_refs_owner ON referrers(owner_telegram_id)"
+
+# Set once the schema has been created/migrated for this process
+_db_initialized = False
+# Column names of users, read once (db_init fills it in after migrating)
+_users_columns: Optional[FrozenSet[str]] = None
+
+
 def db_init() -> None:
+    """Create and migrate the schema. Runs once per process; later calls are no-ops."""
+    global _db_initialized, _users_columns
+    if _db_initialized:
+        return
+
     conn = db_connect()
     cur = conn.cursor()
 
+    # journal_mode=WAL from DB_PRAGMAS is persistent, but some filesystems refuse it
+    journal_mode = cur.execute("PRAGMA journal_mode").fetchone()[0]
+    if str(journal_mode).lower() != "wal":
+        logger.warning(f"SQLite is running in {journal_mode} journal mode, not WAL; writes will be slower")
+
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS referrers (
@@ -104,6 +297,17 @@ def db_init() -> None:
         """
     )
 
+    # Ref codes merged away by dedupe_referrer_owners; invite links carrying them stay valid
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ref_code_aliases (
+            alias_code TEXT PRIMARY KEY,
+            ref_code TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -116,58 +320,102 @@ def db_init() -> None:
         """
     )
 
-    # Lightweight migration for older DBs
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN step2_warning_ack INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-
-    # Add version tracking column
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN last_seen_version TEXT DEFAULT '0.0.0'")
-    except sqlite3.OperationalError:
-        pass
+    # Lightweight migration for older DBs: add only the columns that are missing
+    cur.execute("PRAGMA table_info(users)")
+    existing_columns = {row["name"] for row in cur.fetchall()}
+    for column, ddl in USERS_MIGRATION_COLUMNS:
+        if column in existing_columns:
+            continue
+        try:
+            cur.execute(f"ALTER TABLE users ADD COLUMN {column} {ddl}")
+            existing_columns.add(column)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not add users.{column}: {e}")
 
-    # Add created_at column for tracking first interaction
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN created_at TEXT DEFAULT CURRENT_TIMESTAMP")
-    except sqlite3.OperationalError:
-        pass
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_refs_owner'")
+    if cur.fetchone() is None:
+        try:
+            dedupe_referrer_owners(cur)
+            cur.execute(REFS_OWNER_UNIQUE_INDEX)
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Could not create uq_refs_owner, referral links cannot be saved: {e}")
+            conn.close()
+            raise
+        # Superseded by the unique uq_refs_owner
+        cur.execute("DROP INDEX IF EXISTS idx_refs_owner")
 
-    # Add progress tracking columns for onboarding
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN progress_step INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN progress_visited_sharing INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN progress_shared_invite INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN progress_visited_member_tools INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
-    
-    # Add sponsor confirmation column
-    try:
-        cur.execute("ALTER TABLE users ADD COLUMN sponsor_confirmed INTEGER DEFAULT 0")
-    except sqlite3.OperationalError:
-        pass
+    for ddl in DB_INDEXES:
+        try:
+            cur.execute(ddl)
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"Could not create index: {e}")
 
     conn.commit()
     conn.close()
+    _users_columns = frozenset(existing_columns)
+    _db_initialized = True
+
+
+def dedupe_referrer_owners(cur: sqlite3.Cursor) -> None:
+    """Keep one referrers row per owner (the oldest) and move the dropped codes' teams onto it.
+
+    Older versions could store several ref codes for one owner; uq_refs_owner needs at most one.
+    Each dropped code is kept in ref_code_aliases, so joiners through its links still land in
+    the owner's team (see resolve_ref_code).
+    """
+    cur.execute("""
+        SELECT ref_code, owner_telegram_id, keep_code FROM (
+            SELECT ref_code, owner_telegram_id,
+                   FIRST_VALUE(ref_code) OVER w AS keep_code,
+                   ROW_NUMBER() OVER w AS rn
+            FROM referrers
+            WINDOW w AS (PARTITION BY owner_telegram_id ORDER BY created_at, rowid)
+        )
+        WHERE rn > 1
+    """)
+    for row in cur.fetchall():
+        cur.execute("UPDATE users SET sponsor_code=? WHERE sponsor_code=?", (row["keep_code"], row["ref_code"]))
+        cur.execute(
+            "INSERT OR REPLACE INTO ref_code_aliases (alias_code, ref_code) VALUES (?, ?)",
+            (row["ref_code"], row["keep_code"]),
+        )
+        cur.execute("DELETE FROM referrers WHERE ref_code=?", (row["ref_code"],))
+        logger.warning(
+            f"Merged duplicate ref code {row['ref_code']} into {row['keep_code']} "
+            f"for owner {row['owner_telegram_id']}"
+        )
+
+
+def resolve_ref_code(cur: sqlite3.Cursor, ref_code: str) -> str:
+    """Map a ref code merged away by dedupe_referrer_owners to the code that replaced it."""
+    cur.execute(
+        "SELECT ref_code FROM ref_code_aliases WHERE alias_code=? "
+        "AND NOT EXISTS (SELECT 1 FROM referrers WHERE ref_code=?)",
+        (ref_code, ref_code),
+    )
+    row = cur.fetchone()
+    return row["ref_code"] if row else ref_code
+
+
+def users_has_column(cur: sqlite3.Cursor, column: str) -> bool:
+    """Whether the users table has a column, checking the schema at most once per process."""
+    global _users_columns
+    if _users_columns is None:
+        cur.execute("PRAGMA table_info(users)")
+        _users_columns = frozenset(row["name"] for row in cur.fetchall())
+    return column in _users_columns
+
+
+REF_CODE_ALPHABET = string.ascii_uppercase + string.digits
+# Fresh codes tried before upsert_referrer gives up (36^6 codes, so a second try is already rare)
+REF_CODE_MAX_ATTEMPTS = 6
 
 
 def generate_ref_code(length: int = 6) -> str:
-    alphabet = string.ascii_uppercase + string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+    return "".join(secrets.choice(REF_CODE_ALPHABET) for _ in range(length))
+
+
+AFFILIATE_ID_RE = re.compile(r"bta=(\d{5,6})", re.ASCII)
 
 
 def extract_affiliate_id(url: str) -> Optional[str]:
@@ -177,11 +425,12 @@ def extract_affiliate_id(url: str) -> Optional[str]:
     Example: https://partner.axisfunded.com/visit/?bta=36191&brand=pandora
     Returns: "36191"
     """
-    if not url:
+    # Cheap substring test first so URLs without the parameter skip the regex
+    if not url or "bta=" not in url:
         return None
     
     try:
-        match = re.search(r'bta=(\d{5,6})', url)
+        match = AFFILIATE_ID_RE.search(url)
         return match.group(1) if match else None
     except Exception as e:
         logger.warning(f"Failed to extract affiliate ID from URL: {e}")
@@ -209,8 +458,8 @@ def validate_affiliate_id_match(step1_url: str, step2_url: str) -> Dict[str, Any
 
 
 def get_bot_version() -> str:
-    """Get current bot version from environment variable."""
-    return (os.environ.get("BOT_VERSION") or "1.0.0").strip()
+    """Get current bot version (BOT_VERSION environment variable)."""
+    return BOT_VERSION
 
 
 def get_user_version(telegram_user_id: int) -> str:
@@ -237,16 +486,14 @@ def update_user_version(telegram_user_id: int, version: str) -> None:
     conn = db_connect()
     cur = conn.cursor()
     try:
-        # Ensure user exists in database
+        # Create the user or update their version in one statement
         cur.execute(
-            "INSERT OR IGNORE INTO users (telegram_user_id, last_seen_version) VALUES (?, ?)",
+            """
+            INSERT INTO users (telegram_user_id, last_seen_version) VALUES (?, ?)
+            ON CONFLICT(telegram_user_id) DO UPDATE SET last_seen_version=excluded.last_seen_version
+            """,
             (telegram_user_id, version)
         )
-        # Update version
-        cur.execute(
-            "UPDATE users SET last_seen_version=? WHERE telegram_user_id=?",
-            (version, telegram_user_id)
-        )
         conn.commit()
     except Exception as e:
         logger.warning(f"Failed to update user version: {e}")
@@ -254,6 +501,7 @@ def update_user_version(telegram_user_id: int, version: str) -> None:
         conn.close()
 
 
+@lru_cache(maxsize=256)
 def version_compare(v1: str, v2: str) -> int:
     """
     Compare two version strings.
@@ -331,28 +579,34 @@ async def check_and_show_update_notification(
     """
 
 
-def upsert_user(telegram_user_id: int, sponsor_code: Optional[str] = None) -> None:
+def upsert_user(telegram_user_id: int, sponsor_code: Optional[str] = None) -> Optional[str]:
+    """Save a user, filling in a missing sponsor code. Returns the sponsor code after alias resolution."""
     conn = db_connect()
     cur = conn.cursor()
+    if sponsor_code:
+        sponsor_code = resolve_ref_code(cur, sponsor_code)
 
-    cur.execute("SELECT telegram_user_id, sponsor_code FROM users WHERE telegram_user_id=?", (telegram_user_id,))
-    row = cur.fetchone()
-
-    if row is None:
-        cur.execute(
-            "INSERT INTO users (telegram_user_id, sponsor_code, step1_confirmed, step2_warning_ack) VALUES (?, ?, 0, 0)",
-            (telegram_user_id, sponsor_code),
-        )
-    else:
-        existing = row["sponsor_code"]
-        if sponsor_code and not existing:
-            cur.execute(
-                "UPDATE users SET sponsor_code=?, updated_at=CURRENT_TIMESTAMP WHERE telegram_user_id=?",
-                (sponsor_code, telegram_user_id),
-            )
+    # Insert new users; for existing ones only fill in a missing sponsor code
+    cur.execute(
+        """
+        INSERT INTO users (telegram_user_id, sponsor_code, step1_confirmed, step2_warning_ack) VALUES (?, ?, 0, 0)
+        ON CONFLICT(telegram_user_id) DO UPDATE SET
+            sponsor_code=excluded.sponsor_code,
+            updated_at=CURRENT_TIMESTAMP
+        WHERE excluded.sponsor_code IS NOT NULL AND excluded.sponsor_code != ''
+            AND (users.sponsor_code IS NULL OR users.sponsor_code = '')
+        """,
+        (telegram_user_id, sponsor_code),
+    )
+    # Nothing team-related changes unless a sponsor code was actually written
+    joined_team = sponsor_code is not None and cur.rowcount > 0
 
     conn.commit()
     conn.close()
+    if joined_team:
+        get_cached_team_stats.cache_discard(sponsor_code)
+        get_team_size_ranking.cache_clear()
+    return sponsor_code
 
 
 def get_user_state(telegram_user_id: int) -> Dict[str, Any]:
@@ -394,6 +648,7 @@ def set_step1_confirmed(telegram_user_id: int, confirmed: bool) -> None:
     )
     conn.commit()
     conn.close()
+    get_cached_team_stats.cache_clear()
 
 
 def set_step2_warning_ack(telegram_user_id: int, ack: bool) -> None:
@@ -431,36 +686,60 @@ def set_sponsor_confirmed(telegram_user_id: int, confirmed: bool) -> None:
     conn.close()
 
 
+def move_user_to_sponsor(telegram_user_id: int, sponsor_code: str) -> None:
+    """Point a user (and so their whole downline) at a new sponsor code."""
+    conn = db_connect()
+    conn.execute(
+        "UPDATE users SET sponsor_code = ?, updated_at = CURRENT_TIMESTAMP WHERE telegram_user_id = ?",
+        (sponsor_code, telegram_user_id),
+    )
+    conn.commit()
+    conn.close()
+    get_cached_team_stats.cache_clear()
+    get_team_size_ranking.cache_clear()
+
+
+def delete_user(telegram_user_id: int, with_referrer: bool = False) -> Tuple[int, int]:
+    """Delete a user's row, and optionally their referral links. Returns (users, referrers) deleted."""
+    conn = db_connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
+    users_deleted = cur.rowcount
+    refs_deleted = 0
+    if with_referrer:
+        cur.execute("DELETE FROM referrers WHERE owner_telegram_id = ?", (telegram_user_id,))
+        refs_deleted = cur.rowcount
+    conn.commit()
+    conn.close()
+    # The user may have been on someone's team, and may have had one of their own
+    get_cached_team_stats.cache_clear()
+    get_team_size_ranking.cache_clear()
+    return users_deleted, refs_deleted
+
+
 def get_team_stats(ref_code: str) -> Dict[str, Any]:
     """Get statistics for a team based on ref code."""
     conn = db_connect()
     cur = conn.cursor()
     
-    # Total team members (people who used this ref code)
-    cur.execute(
-        "SELECT COUNT(*) as count FROM users WHERE sponsor_code = ?",
-        (ref_code,)
-    )
-    total_team = cur.fetchone()["count"]
-    
-    # Team members who set up their own links
+    # Team size, members with their own links and Step 1 confirmations in one pass
     cur.execute(
         """
-        SELECT COUNT(*) as count 
-        FROM users u 
-        INNER JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id 
+        SELECT
+            COUNT(*) as total_team,
+            COALESCE(SUM(
+                (SELECT COUNT(*) FROM referrers r WHERE r.owner_telegram_id = u.telegram_user_id)
+            ), 0) as team_with_links,
+            COALESCE(SUM(CASE WHEN u.step1_confirmed = 1 THEN 1 ELSE 0 END), 0) as team_step1_confirmed
+        FROM users u
         WHERE u.sponsor_code = ?
         """,
         (ref_code,)
     )
-    team_with_links = cur.fetchone()["count"]
-    
-    # Team members who confirmed Step 1
-    cur.execute(
-        "SELECT COUNT(*) as count FROM users WHERE sponsor_code = ? AND step1_confirmed = 1",
-        (ref_code,)
-    )
-    team_step1_confirmed = cur.fetchone()["count"]
+    row = cur.fetchone()
+    total_team = row["total_team"]
+    team_with_links = row["team_with_links"]
+    team_step1_confirmed = row["team_step1_confirmed"]
     
     conn.close()
     
@@ -471,6 +750,26 @@ def get_team_stats(ref_code: str) -> Dict[str, Any]:
     }
 
 
+# Score tiers: the thresholds are ascending inclusive lower bounds, with one more score than
+# thresholds (the first score applies below the lowest threshold)
+CONVERSION_STAR_THRESHOLDS = (20, 40, 60)
+CONVERSION_STARS = (0.0, 1.0, 2.0, 3.0)
+TEAM_SIZE_STAR_THRESHOLDS = (20, 30, 50)
+TEAM_SIZE_STARS = (0.0, 1.0, 1.5, 2.0)
+# Per-performer activity score in /adminstats
+ADMIN_ENGAGEMENT_THRESHOLDS = (20, 40, 60)
+ADMIN_ENGAGEMENT_SCORES = (0.0, 1.0, 1.5, 2.0)
+ADMIN_TEAM_BONUS_THRESHOLDS = (20, 30)
+ADMIN_TEAM_BONUS_SCORES = (0.0, 0.3, 0.5)
+# Star display per half-star step of the 0-5 score
+ACTIVITY_STAR_DISPLAY = tuple("⭐" * (steps // 2) + ("½" if steps % 2 else "") for steps in range(11))
+
+
+def step_score(value: float, thresholds: Tuple[float, ...], scores: Tuple[float, ...]) -> float:
+    """Return the score of the highest tier whose threshold value reaches."""
+    return scores[bisect.bisect_right(thresholds, value)]
+
+
 def calculate_activity_score(visitors: int, active_members: int) -> Tuple[float, str]:
     """
     Calculate activity score (0-5 stars) based on conversion rate and team size.
@@ -478,36 +777,13 @@ def calculate_activity_score(visitors: int, active_members: int) -> Tuple[float,
     """
     # Member conversion rate score (0-3 stars)
     conversion_rate = (active_members / visitors * 100) if visitors > 0 else 0
-    if conversion_rate >= 60:
-        conversion_stars = 3.0
-    elif conversion_rate >= 40:
-        conversion_stars = 2.0
-    elif conversion_rate >= 20:
-        conversion_stars = 1.0
-    else:
-        conversion_stars = 0.0
+    conversion_stars = step_score(conversion_rate, CONVERSION_STAR_THRESHOLDS, CONVERSION_STARS)
     
     # Team size bonus (0-2 stars)
-    if visitors >= 50:
-        size_stars = 2.0
-    elif visitors >= 30:
-        size_stars = 1.5
-    elif visitors >= 20:
-        size_stars = 1.0
-    else:
-        size_stars = 0.0
+    size_stars = step_score(visitors, TEAM_SIZE_STAR_THRESHOLDS, TEAM_SIZE_STARS)
     
     total_score = conversion_stars + size_stars
-    
-    # Generate star display
-    full_stars = int(total_score)
-    has_half = (total_score % 1) >= 0.5
-    
-    stars = "⭐" * full_stars
-    if has_half:
-        stars += "½"
-    
-    return (total_score, stars)
+    return (total_score, ACTIVITY_STAR_DISPLAY[int(total_score * 2)])
 
 
 def get_user_rank(user_id: int) -> Dict[str, Any]:
@@ -533,22 +809,15 @@ def get_user_rank(user_id: int) -> Dict[str, Any]:
     cur.execute("SELECT COUNT(DISTINCT ref_code) as count FROM referrers")
     total_affiliates = cur.fetchone()["count"]
     
-    # Count how many have larger teams
-    cur.execute("""
-        SELECT COUNT(DISTINCT sponsor_code) as count
-        FROM users
-        WHERE sponsor_code IS NOT NULL
-        GROUP BY sponsor_code
-        HAVING COUNT(*) > ?
-    """, (user_team_size,))
+    conn.close()
     
-    better_count = len(cur.fetchall())
+    # Count how many have larger teams
+    team_sizes = get_team_size_ranking()
+    better_count = len(team_sizes) - bisect.bisect_right(team_sizes, user_team_size)
     rank = better_count + 1
     
     percentile = int((rank / total_affiliates * 100)) if total_affiliates > 0 else 0
     
-    conn.close()
-    
     return {
         "rank": rank,
         "total": total_affiliates,
@@ -563,9 +832,7 @@ def get_growth_stats(ref_code: str) -> Dict[str, Any]:
     cur = conn.cursor()
     
     # Check if created_at column exists
-    cur.execute("PRAGMA table_info(users)")
-    columns = [row["name"] for row in cur.fetchall()]
-    has_created_at = "created_at" in columns
+    has_created_at = users_has_column(cur, "created_at")
     
     stats = {
         "visitors_7d": 0,
@@ -634,48 +901,107 @@ def get_user_streak(user_id: int) -> int:
     return 0
 
 
-def get_average_stats() -> Dict[str, Any]:
-    """Get average statistics across all affiliates."""
+# Platform-wide averages are the same for every user, so they are shared for this long
+PLATFORM_STATS_TTL = 60
+
+
+def ttl_cache(seconds: float, maxsize: int = 1024):
+    """Cache a function's result per positional arguments for the given number of seconds.
+
+    Holds at most maxsize entries: expired ones are pruned first, then the oldest.
+    """
+    def decorator(func):
+        entries: Dict[Tuple, Tuple[float, Any]] = {}
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            entry = entries.get(args)
+            if entry and now - entry[0] < seconds:
+                return entry[1]
+            value = func(*args)
+            with lock:
+                entries.pop(args, None)
+                if len(entries) >= maxsize:
+                    for key in [k for k, (stored, _) in entries.items() if now - stored >= seconds]:
+                        del entries[key]
+                    while len(entries) >= maxsize:
+                        del entries[next(iter(entries))]
+                entries[args] = (now, value)
+            return value
+
+        def cache_discard(*args) -> None:
+            with lock:
+                entries.pop(args, None)
+
+        def cache_clear() -> None:
+            with lock:
+                entries.clear()
+
+        wrapper.cache_discard = cache_discard
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+# Team counts behind the share templates and rank lookups; cleared when a user joins, confirms Step 1 or sets links
+TEAM_STATS_TTL = 30
+
+
+@ttl_cache(TEAM_STATS_TTL)
+def get_cached_team_stats(ref_code: str) -> Dict[str, Any]:
+    """get_team_stats, reused for TEAM_STATS_TTL seconds per ref code."""
+    return get_team_stats(ref_code)
+
+
+@ttl_cache(TEAM_STATS_TTL)
+def get_team_size_ranking() -> List[int]:
+    """Team size of every sponsor code in ascending order, for rank lookups (do not mutate)."""
     conn = db_connect()
-    cur = conn.cursor()
-    
-    # Get all referrers
-    cur.execute("SELECT ref_code FROM referrers")
-    all_refs = cur.fetchall()
-    
-    if not all_refs:
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COUNT(*) as team_size
+            FROM users
+            WHERE sponsor_code IS NOT NULL
+            GROUP BY sponsor_code
+            ORDER BY team_size
+        """)
+        return [row["team_size"] for row in cur.fetchall()]
+    finally:
         conn.close()
+
+
+def _query_average_stats(cur: sqlite3.Cursor) -> Dict[str, Any]:
+    """Run the all-affiliate average queries on an open cursor."""
+    # Referrer count and the visitor/member totals across all their teams in one round trip
+    cur.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM referrers) AS nrefs,
+            (SELECT COUNT(*) FROM users
+             WHERE sponsor_code IN (SELECT ref_code FROM referrers)) AS total_visitors,
+            (SELECT COUNT(*) FROM users u
+             INNER JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id
+             WHERE u.sponsor_code IN (SELECT ref_code FROM referrers)) AS total_members
+    """)
+    row = cur.fetchone()
+    count = row["nrefs"]
+    
+    if not count:
         return {
             "avg_visitors": 0,
             "avg_members": 0,
             "avg_conversion": 0
         }
     
-    total_visitors = 0
-    total_members = 0
-    
-    for ref in all_refs:
-        ref_code = ref["ref_code"]
-        
-        # Count visitors
-        cur.execute("SELECT COUNT(*) as count FROM users WHERE sponsor_code = ?", (ref_code,))
-        total_visitors += cur.fetchone()["count"]
-        
-        # Count members
-        cur.execute("""
-            SELECT COUNT(*) as count FROM users u
-            INNER JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id
-            WHERE u.sponsor_code = ?
-        """, (ref_code,))
-        total_members += cur.fetchone()["count"]
+    total_visitors = row["total_visitors"]
+    total_members = row["total_members"]
     
-    count = len(all_refs)
     avg_visitors = int(total_visitors / count) if count > 0 else 0
     avg_members = int(total_members / count) if count > 0 else 0
     avg_conversion = int((total_members / total_visitors * 100)) if total_visitors > 0 else 0
     
-    conn.close()
-    
     return {
         "avg_visitors": avg_visitors,
         "avg_members": avg_members,
@@ -683,59 +1009,88 @@ def get_average_stats() -> Dict[str, Any]:
     }
 
 
-def get_top10_stats() -> Dict[str, Any]:
-    """Get average statistics for top 10% of affiliates."""
+@ttl_cache(PLATFORM_STATS_TTL)
+def get_average_stats() -> Dict[str, Any]:
+    """Get average statistics across all affiliates."""
     conn = db_connect()
-    cur = conn.cursor()
-    
-    # Get all team sizes
+    try:
+        return _query_average_stats(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _query_top10_stats(cur: sqlite3.Cursor) -> Dict[str, Any]:
+    """Run the top-10% average queries on an open cursor."""
+    # Rank teams by size and sum visitors/members over the top 10% in one query
     cur.execute("""
-        SELECT sponsor_code, COUNT(*) as team_size
-        FROM users
-        WHERE sponsor_code IS NOT NULL
-        GROUP BY sponsor_code
-        ORDER BY team_size DESC
+        WITH teams AS (
+            SELECT sponsor_code, COUNT(*) AS team_size
+            FROM users
+            WHERE sponsor_code IS NOT NULL
+            GROUP BY sponsor_code
+        ),
+        team_members AS (
+            SELECT u.sponsor_code, COUNT(*) AS members
+            FROM users u
+            INNER JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id
+            WHERE u.sponsor_code IS NOT NULL
+            GROUP BY u.sponsor_code
+        ),
+        ranked AS (
+            SELECT t.team_size, COALESCE(m.members, 0) AS members,
+                   ROW_NUMBER() OVER (ORDER BY t.team_size DESC, t.sponsor_code DESC) AS rn,
+                   COUNT(*) OVER () AS total
+            FROM teams t
+            LEFT JOIN team_members m ON m.sponsor_code = t.sponsor_code
+        )
+        SELECT COUNT(*) AS top10_count,
+               COALESCE(SUM(team_size), 0) AS total_visitors,
+               COALESCE(SUM(members), 0) AS total_members
+        FROM ranked
+        WHERE rn <= MAX(1, total / 10)
     """)
+    row = cur.fetchone()
+    top10_count = row["top10_count"]
     
-    all_teams = cur.fetchall()
-    
-    if not all_teams:
-        conn.close()
+    if not top10_count:
         return {
             "top10_visitors": 0,
             "top10_members": 0
         }
     
-    # Get top 10%
-    top10_count = max(1, int(len(all_teams) * 0.1))
-    top_teams = all_teams[:top10_count]
-    
-    total_visitors = 0
-    total_members = 0
-    
-    for team in top_teams:
-        ref_code = team["sponsor_code"]
-        total_visitors += team["team_size"]
-        
-        # Count members for this team
-        cur.execute("""
-            SELECT COUNT(*) as count FROM users u
-            INNER JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id
-            WHERE u.sponsor_code = ?
-        """, (ref_code,))
-        total_members += cur.fetchone()["count"]
+    total_visitors = row["total_visitors"]
+    total_members = row["total_members"]
     
     avg_visitors = int(total_visitors / top10_count) if top10_count > 0 else 0
     avg_members = int(total_members / top10_count) if top10_count > 0 else 0
     
-    conn.close()
-    
     return {
         "top10_visitors": avg_visitors,
         "top10_members": avg_members
     }
 
 
+@ttl_cache(PLATFORM_STATS_TTL)
+def get_top10_stats() -> Dict[str, Any]:
+    """Get average statistics for top 10% of affiliates."""
+    conn = db_connect()
+    try:
+        return _query_top10_stats(conn.cursor())
+    finally:
+        conn.close()
+
+
+@ttl_cache(PLATFORM_STATS_TTL)
+def get_platform_benchmarks() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Get the all-affiliate and top-10% averages over a single connection."""
+    conn = db_connect()
+    try:
+        cur = conn.cursor()
+        return _query_average_stats(cur), _query_top10_stats(cur)
+    finally:
+        conn.close()
+
+
 def get_personal_stats(user_id: int) -> Dict[str, Any]:
     """Get comprehensive personal statistics for a user."""
     db_init()
@@ -767,6 +1122,10 @@ def get_personal_stats(user_id: int) -> Dict[str, Any]:
     # Calculate conversion rate
     conversion = int((active_members / visitors * 100)) if visitors > 0 else 0
     
+    # Activity breakdown (estimates until per-member activity is logged)
+    active_24h = int(active_members * 0.3)  # Estimate: 30% active in 24h
+    recent_7d = int(active_members * 0.5)   # Estimate: 50% active in 7d
+    
     return {
         "ref_code": ref_code,
         "visitors": visitors,
@@ -778,102 +1137,91 @@ def get_personal_stats(user_id: int) -> Dict[str, Any]:
         "activity_score": score,
         "activity_stars": stars,
         "growth": growth,
-        "streak": streak
+        "streak": streak,
+        "active_24h": active_24h,
+        "recent_7d": recent_7d,
+        "inactive": visitors - recent_7d
     }
 
 
-def get_admin_statistics() -> Dict[str, Any]:
-    """Get comprehensive bot statistics for admin."""
-    conn = db_connect()
-    cur = conn.cursor()
-    
-    # Total unique users
-    cur.execute("SELECT COUNT(*) as count FROM users")
-    total_users = cur.fetchone()["count"]
+# Personal stats are reused across My Stats screens opened in quick succession
+PERSONAL_STATS_TTL = 2.0
+
+
+async def fetch_personal_stats(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> Dict[str, Any]:
+    """get_personal_stats, reused from user_data if fetched within PERSONAL_STATS_TTL seconds.
+
+    Only the queries run in a worker thread; user_data is read and written on the event loop.
+    """
+    now = time.monotonic()
+    cached = context.user_data.get("_stats_cache")
+    if cached and cached[0] == user_id and now - cached[1] < PERSONAL_STATS_TTL:
+        return cached[2]
+    stats = await asyncio.to_thread(get_personal_stats, user_id)
+    context.user_data["_stats_cache"] = (user_id, time.monotonic(), stats)
+    return stats
+
+
+# Per-row counters for the admin statistics scan of users; keys match the result dict
+ADMIN_USER_COUNTERS = (
+    "COUNT(*) AS total_users",
+    "SUM(CASE WHEN sponsor_code IS NULL OR sponsor_code = '' THEN 1 ELSE 0 END) AS generic_visitors",
+    "SUM(CASE WHEN step1_confirmed = 1 THEN 1 ELSE 0 END) AS step1_confirmed",
+    "SUM(CASE WHEN step2_warning_ack = 1 THEN 1 ELSE 0 END) AS step2_ack",
+)
+ADMIN_USER_TIME_COUNTERS = (
+    "SUM(CASE WHEN datetime(created_at) > datetime('now', '-1 day') THEN 1 ELSE 0 END) AS users_24h",
+    "SUM(CASE WHEN datetime(created_at) > datetime('now', '-1 day')"
+    " AND (sponsor_code IS NULL OR sponsor_code = '') THEN 1 ELSE 0 END) AS generic_24h",
+    "SUM(CASE WHEN datetime(created_at) > datetime('now', '-7 days') THEN 1 ELSE 0 END) AS users_7d",
+)
+
+
+def _query_admin_statistics(cur: sqlite3.Cursor) -> Dict[str, Any]:
+    """Run the admin statistics queries on an open cursor (one scan per table)."""
+    # Check if created_at column exists
+    has_created_at = users_has_column(cur, "created_at")
     
-    # Generic bot visitors (no sponsor code)
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE sponsor_code IS NULL OR sponsor_code = ''")
-    generic_visitors = cur.fetchone()["count"]
+    # All user counters in a single pass over users
+    counters = ADMIN_USER_COUNTERS + (ADMIN_USER_TIME_COUNTERS if has_created_at else ())
+    cur.execute(f"SELECT {', '.join(counters)} FROM users")
+    row = cur.fetchone()
+    # SUM() is NULL on an empty table
+    counts = {key: row[key] or 0 for key in row.keys()}
     
-    # Users via referral
+    total_users = counts["total_users"]
+    generic_visitors = counts["generic_visitors"]
     referred_users = total_users - generic_visitors
-    
-    # Users who set their own links
-    cur.execute("SELECT COUNT(*) as count FROM referrers")
-    users_with_links = cur.fetchone()["count"]
-    
-    # Users who confirmed Step 1
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE step1_confirmed = 1")
-    step1_confirmed = cur.fetchone()["count"]
-    
-    # Users who acknowledged Step 2
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE step2_warning_ack = 1")
-    step2_ack = cur.fetchone()["count"]
-    
-    # Check if created_at column exists
-    cur.execute("PRAGMA table_info(users)")
-    columns = [row["name"] for row in cur.fetchall()]
-    has_created_at = "created_at" in columns
-    
-    # Users in last 24 hours (if created_at exists)
-    users_24h = 0
+    step1_confirmed = counts["step1_confirmed"]
+    step2_ack = counts["step2_ack"]
+    users_24h = counts.get("users_24h", 0)
+    generic_24h = counts.get("generic_24h", 0)
+    referred_24h = users_24h - generic_24h
+    users_7d = counts.get("users_7d", 0)
+    
+    # Links set and their recent growth in a single pass over referrers
+    users_with_links = None
     links_24h = 0
-    users_7d = 0
     links_7d = 0
-    generic_24h = 0
-    referred_24h = 0
-    
     if has_created_at:
         try:
-            # New users in last 24 hours
-            cur.execute("""
-                SELECT COUNT(*) as count FROM users 
-                WHERE created_at IS NOT NULL 
-                AND datetime(created_at) > datetime('now', '-1 day')
-            """)
-            users_24h = cur.fetchone()["count"]
-            
-            # Generic visitors in last 24 hours
-            cur.execute("""
-                SELECT COUNT(*) as count FROM users 
-                WHERE created_at IS NOT NULL 
-                AND datetime(created_at) > datetime('now', '-1 day')
-                AND (sponsor_code IS NULL OR sponsor_code = '')
-            """)
-            generic_24h = cur.fetchone()["count"]
-            
-            # Referred users in last 24 hours
-            referred_24h = users_24h - generic_24h
-            
-            # New links in last 24 hours
-            cur.execute("""
-                SELECT COUNT(*) as count FROM referrers 
-                WHERE created_at IS NOT NULL 
-                AND datetime(created_at) > datetime('now', '-1 day')
-            """)
-            links_24h = cur.fetchone()["count"]
-            
-            # Users in last 7 days
-            cur.execute("""
-                SELECT COUNT(*) as count FROM users 
-                WHERE created_at IS NOT NULL 
-                AND datetime(created_at) > datetime('now', '-7 days')
-            """)
-            users_7d = cur.fetchone()["count"]
-            
-            # New links in last 7 days
             cur.execute("""
-                SELECT COUNT(*) as count FROM referrers 
-                WHERE created_at IS NOT NULL 
-                AND datetime(created_at) > datetime('now', '-7 days')
+                SELECT COUNT(*) AS total,
+                       SUM(CASE WHEN datetime(created_at) > datetime('now', '-1 day') THEN 1 ELSE 0 END) AS links_24h,
+                       SUM(CASE WHEN datetime(created_at) > datetime('now', '-7 days') THEN 1 ELSE 0 END) AS links_7d
+                FROM referrers
             """)
-            links_7d = cur.fetchone()["count"]
+            row = cur.fetchone()
+            users_with_links = row["total"]
+            links_24h = row["links_24h"] or 0
+            links_7d = row["links_7d"] or 0
         except Exception:
-            # If queries fail, just use 0
+            # Older referrers table without created_at: fall back to the plain count
             pass
-    
-    conn.close()
-    
+    if users_with_links is None:
+        cur.execute("SELECT COUNT(*) as count FROM referrers")
+        users_with_links = cur.fetchone()["count"]
+
     return {
         "total_users": total_users,
         "generic_visitors": generic_visitors,
@@ -891,30 +1239,48 @@ def get_admin_statistics() -> Dict[str, Any]:
     }
 
 
-def get_top_performers(limit: int = 10) -> List[Dict[str, Any]]:
-    """Get top performing referrers by team size with engagement metrics."""
+def get_admin_statistics() -> Dict[str, Any]:
+    """Get comprehensive bot statistics for admin."""
     conn = db_connect()
-    cur = conn.cursor()
-    
+    try:
+        # One read transaction: every counter comes from the same snapshot
+        conn.execute("BEGIN")
+        stats = _query_admin_statistics(conn.cursor())
+        conn.commit()
+        return stats
+    finally:
+        conn.close()
+
+
+def _query_top_performers(cur: sqlite3.Cursor, limit: int) -> List[Dict[str, Any]]:
+    """Run the top performers queries on an open cursor."""
     # Check if created_at column exists for growth tracking
-    cur.execute("PRAGMA table_info(users)")
-    columns = [row["name"] for row in cur.fetchall()]
-    has_created_at = "created_at" in columns
+    has_created_at = users_has_column(cur, "created_at")
+    
+    # 7-day growth is aggregated in the same pass; DISTINCT keeps it per user
+    # even if the team_ref join yields several rows for one member
+    growth_expr = (
+        "COUNT(DISTINCT CASE WHEN u.created_at IS NOT NULL "
+        "AND datetime(u.created_at) > datetime('now', '-7 days') "
+        "THEN u.telegram_user_id END)"
+        if has_created_at else "0"
+    )
     
-    # Get top referrers with their team sizes and engagement metrics
-    cur.execute("""
+    # Get top referrers with their team sizes, engagement metrics and growth
+    cur.execute(f"""
         SELECT 
             u.sponsor_code as ref_code,
             COUNT(*) as team_size,
             r.owner_telegram_id,
             COUNT(CASE WHEN team_ref.ref_code IS NOT NULL THEN 1 END) as team_with_links,
-            COUNT(CASE WHEN u.step1_confirmed = 1 THEN 1 END) as team_step1_confirmed
+            COUNT(CASE WHEN u.step1_confirmed = 1 THEN 1 END) as team_step1_confirmed,
+            {growth_expr} as team_growth_7d
         FROM users u
         LEFT JOIN referrers r ON u.sponsor_code = r.ref_code
         LEFT JOIN referrers team_ref ON u.telegram_user_id = team_ref.owner_telegram_id
         WHERE u.sponsor_code IS NOT NULL AND u.sponsor_code != ''
         GROUP BY u.sponsor_code
-        ORDER BY team_size DESC
+        ORDER BY team_size DESC, u.sponsor_code DESC
         LIMIT ?
     """, (limit,))
     
@@ -927,40 +1293,76 @@ def get_top_performers(limit: int = 10) -> List[Dict[str, Any]]:
         team_with_links = row["team_with_links"]
         team_step1_confirmed = row["team_step1_confirmed"]
         
-        # Calculate growth rate (last 7 days) if created_at exists
-        team_growth_7d = 0
-        if has_created_at:
-            try:
-                cur.execute("""
-                    SELECT COUNT(*) as count FROM users
-                    WHERE sponsor_code = ?
-                    AND created_at IS NOT NULL
-                    AND datetime(created_at) > datetime('now', '-7 days')
-                """, (ref_code,))
-                team_growth_7d = cur.fetchone()["count"]
-            except Exception:
-                team_growth_7d = 0
-        
         performers.append({
             "ref_code": ref_code,
             "team_size": team_size,
             "team_with_links": team_with_links,
             "team_step1_confirmed": team_step1_confirmed,
-            "team_growth_7d": team_growth_7d,
+            "team_growth_7d": row["team_growth_7d"],
             "owner_telegram_id": row["owner_telegram_id"],
             "has_growth_data": has_created_at
         })
     
-    conn.close()
     return performers
 
 
+def get_top_performers(limit: int = 10) -> List[Dict[str, Any]]:
+    """Get top performing referrers by team size with engagement metrics."""
+    conn = db_connect()
+    try:
+        return _query_top_performers(conn.cursor(), limit)
+    finally:
+        conn.close()
+
+
+def get_admin_dashboard_data(limit: int = 10) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Get admin statistics and top performers over a single connection and snapshot."""
+    conn = db_connect()
+    try:
+        conn.execute("BEGIN")
+        cur = conn.cursor()
+        data = (_query_admin_statistics(cur), _query_top_performers(cur, limit))
+        conn.commit()
+        return data
+    finally:
+        conn.close()
+
+
+# Admin aggregates are reused for this many seconds; "/adminstats refresh" bypasses the cache
+ADMIN_STATS_TTL = 120
+_admin_stats_cache: Dict[Any, Tuple[float, datetime, Any]] = {}
+
+
+def _admin_cached(key: Any, loader, refresh: bool = False) -> Tuple[Any, datetime]:
+    """Return (loader()'s result, when it was computed), reusing a copy younger than ADMIN_STATS_TTL."""
+    now = time.monotonic()
+    hit = _admin_stats_cache.get(key)
+    if hit is not None and not refresh and now - hit[0] < ADMIN_STATS_TTL:
+        return hit[2], hit[1]
+    data = loader()
+    generated_at = datetime.now()
+    _admin_stats_cache[key] = (now, generated_at, data)
+    return data, generated_at
+
+
+def get_admin_statistics_cached(refresh: bool = False) -> Tuple[Dict[str, Any], datetime]:
+    """get_admin_statistics with a short TTL cache; also returns when the stats were computed."""
+    return _admin_cached("stats", get_admin_statistics, refresh)
+
+
+def get_admin_dashboard_data_cached(limit: int = 10, refresh: bool = False) -> Tuple[Tuple[Dict[str, Any], List[Dict[str, Any]]], datetime]:
+    """get_admin_dashboard_data with a short TTL cache; also returns when the data was computed."""
+    return _admin_cached(("dashboard", limit), lambda: get_admin_dashboard_data(limit), refresh)
+
+
 def get_referrer_by_owner(owner_telegram_id: int) -> Optional[Dict[str, Any]]:
     conn = db_connect()
-    cur = conn.cursor()
-    cur.execute("SELECT ref_code, step1_url, step2_url FROM referrers WHERE owner_telegram_id=?", (owner_telegram_id,))
-    row = cur.fetchone()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT ref_code, step1_url, step2_url FROM referrers WHERE owner_telegram_id=?", (owner_telegram_id,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
     if not row:
         return None
     return {"ref_code": row["ref_code"], "step1_url": row["step1_url"], "step2_url": row["step2_url"]}
@@ -968,10 +1370,12 @@ def get_referrer_by_owner(owner_telegram_id: int) -> Optional[Dict[str, Any]]:
 
 def get_referrer_by_code(ref_code: str) -> Optional[Dict[str, Any]]:
     conn = db_connect()
-    cur = conn.cursor()
-    cur.execute("SELECT ref_code, owner_telegram_id, step1_url, step2_url FROM referrers WHERE ref_code=?", (ref_code,))
-    row = cur.fetchone()
-    conn.close()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT ref_code, owner_telegram_id, step1_url, step2_url FROM referrers WHERE ref_code=?", (ref_code,))
+        row = cur.fetchone()
+    finally:
+        conn.close()
     if not row:
         return None
     return {
@@ -983,36 +1387,61 @@ def get_referrer_by_code(ref_code: str) -> Optional[Dict[str, Any]]:
 
 
 def upsert_referrer(owner_telegram_id: int, step1_url: str, step2_url: str) -> Dict[str, Any]:
-    existing = get_referrer_by_owner(owner_telegram_id)
     conn = db_connect()
-    cur = conn.cursor()
-
-    if existing:
-        ref_code = existing["ref_code"]
-        cur.execute("UPDATE referrers SET step1_url=?, step2_url=? WHERE ref_code=?", (step1_url, step2_url, ref_code))
-    else:
-        ref_code = generate_ref_code()
-        while get_referrer_by_code(ref_code):
+    try:
+        cur = conn.cursor()
+        # New owners get the generated code; existing owners keep theirs and only the links change
+        for attempt in range(REF_CODE_MAX_ATTEMPTS):
             ref_code = generate_ref_code()
-        cur.execute(
-            "INSERT INTO referrers (ref_code, owner_telegram_id, step1_url, step2_url) VALUES (?, ?, ?, ?)",
-            (ref_code, owner_telegram_id, step1_url, step2_url),
-        )
-
-    conn.commit()
-    conn.close()
+            # Never hand out a code that still routes old invite links to another owner
+            cur.execute("SELECT 1 FROM ref_code_aliases WHERE alias_code=?", (ref_code,))
+            if cur.fetchone() is not None:
+                if attempt == REF_CODE_MAX_ATTEMPTS - 1:
+                    raise sqlite3.IntegrityError(f"No unused ref code after {REF_CODE_MAX_ATTEMPTS} attempts")
+                continue
+            try:
+                cur.execute(
+                    """
+                    INSERT INTO referrers (ref_code, owner_telegram_id, step1_url, step2_url) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(owner_telegram_id) DO UPDATE SET
+                        step1_url=excluded.step1_url,
+                        step2_url=excluded.step2_url
+                    """,
+                    (ref_code, owner_telegram_id, step1_url, step2_url),
+                )
+                break
+            except sqlite3.IntegrityError:
+                # The generated ref code is already taken
+                if attempt == REF_CODE_MAX_ATTEMPTS - 1:
+                    raise
+
+        cur.execute("SELECT ref_code FROM referrers WHERE owner_telegram_id=?", (owner_telegram_id,))
+        ref_code = cur.fetchone()["ref_code"]
+        conn.commit()
+    finally:
+        conn.close()
+    get_cached_team_stats.cache_clear()
     return {"ref_code": ref_code, "step1_url": step1_url, "step2_url": step2_url}
 
 
+URL_PREFIX_RE = re.compile(r"https?://", re.IGNORECASE | re.ASCII)
+
+
 def looks_like_url(text: str) -> bool:
-    return bool(re.match(r"^https?://", (text or "").strip(), flags=re.IGNORECASE))
+    return bool(URL_PREFIX_RE.match((text or "").strip()))
+
+
+@lru_cache(maxsize=1024)
+def url_netloc(url: str) -> str:
+    """Lower-cased network location of a URL (cached: the same links get pasted again)."""
+    return urlparse(url.strip()).netloc.lower()
 
-from urllib.parse import urlparse
 
 def url_domain_contains(url: str, domain: str) -> bool:
     try:
-        return domain.lower() in urlparse((url or "").strip()).netloc.lower()
-    except Exception:
+        return domain.lower() in url_netloc(url or "")
+    except ValueError:
+        # urlparse rejects malformed hosts such as an unclosed IPv6 bracket
         return False
 
 
@@ -1079,6 +1508,11 @@ def mark_progress_action(user_id: int, action: str) -> None:
     conn.close()
 
 
+def get_progress_percentage(user_id: int) -> int:
+    """Look up a user's progress and return their overall completion percentage."""
+    return calculate_progress_percentage(get_user_progress(user_id), user_id)
+
+
 def calculate_progress_percentage(progress: Dict[str, Any], user_id: int) -> int:
     """Calculate overall progress percentage based on completed steps."""
     step = progress["progress_step"]
@@ -1180,7 +1614,9 @@ def detect_url_type(url: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=1)
 def get_bot_username() -> str:
+    """Bot username for invite links; the environment is read once per process."""
     return (os.environ.get("BOT_USERNAME") or BOT_USERNAME_DEFAULT).strip()
 
 
@@ -1191,6 +1627,26 @@ def build_invite_link(ref_code: str, content: Optional[Dict[str, Any]] = None) -
     return f"https://t.me/{get_bot_username()}?start={ref_code}"
 
 
+def cached_keyboard(builder):
+    """Reuse a static keyboard per loaded content block (and arguments).
+
+    The cache lives on the content block itself, so it is dropped together with
+    the parsed content when content.json changes.
+    """
+    @wraps(builder)
+    def wrapper(content: Dict[str, Any], *args, **kwargs) -> InlineKeyboardMarkup:
+        cache = content.get("_kb_cache")
+        if cache is None:
+            return builder(content, *args, **kwargs)
+        key = (builder.__name__, args, tuple(sorted(kwargs.items())))
+        keyboard = cache.get(key)
+        if keyboard is None:
+            keyboard = cache[key] = builder(content, *args, **kwargs)
+        return keyboard
+    return wrapper
+
+
+@cached_keyboard
 def build_main_menu(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     # Order requested:
     # What is Pandora AI
@@ -1216,71 +1672,89 @@ def build_main_menu(content: Dict[str, Any]) -> InlineKeyboardMarkup:
         [InlineKeyboardButton(ui_get(content, "menu_support", "🧑‍💻 Support"), callback_data="menu:support")],
         [InlineKeyboardButton(ui_get(content, "menu_disclaimer", "⚠️ Disclaimer"), callback_data="menu:disclaimer")],
     ]
-    return InlineKeyboardMarkup(keyboard)
+    return InlineKeyboardMarkup(keyboard)
+
+
+# Single-button submenu rows as (ui key, fallback label, callback_data).
+# A ui key of None means the label is used as-is.
+BACK_TO_SHARING_TOOLS_ROW = ("back_to_sharing_tools", "⬅️ Back to Sharing Tools", "menu:affiliate_tools")
+BACK_TO_MY_STATS_ROW = ("back_to_my_stats", "⬅️ Back to My Stats", "mystats:hub")
+BACK_TO_TEAM_STATS_ROW = ("back_to_team_stats", "⬅️ Back to Team Stats", "mystats:team_hub")
+BACK_TO_MY_ACTIONS_ROW = ("back_to_my_stats", "⬅️ Back to My Stats", "mystats:actions")
+BACK_TO_FAQ_TOPICS_ROW = (None, "⬅️ Back to topics", "faq_back_topics")
+
+
+def build_submenu(content: Dict[str, Any], *row_specs: Tuple[Optional[str], str, str]) -> InlineKeyboardMarkup:
+    """Build a one-button-per-row submenu from row specs, ending with 'Back to menu'."""
+    rows = [
+        [InlineKeyboardButton(ui_get(content, key, label) if key else label, callback_data=cb)]
+        for key, label, cb in row_specs
+    ]
+    rows.append([InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")])
+    return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def back_to_menu_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([[InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]])
+    return build_submenu(content)
 
 
+@cached_keyboard
 def sharing_tools_submenu_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Keyboard with 'Back to Sharing Tools' and 'Back to menu' buttons."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_sharing_tools", "⬅️ Back to Sharing Tools"), callback_data="menu:affiliate_tools")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_SHARING_TOOLS_ROW)
 
 
+@cached_keyboard
 def my_stats_hub_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Main My Stats hub with 4 options."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "btn_personal_stats", "📊 Personal Stats"), callback_data="mystats:personal")],
-        [InlineKeyboardButton(ui_get(content, "btn_my_milestones", "🎖️ My Milestones"), callback_data="mystats:milestones")],
-        [InlineKeyboardButton(ui_get(content, "btn_my_actions", "⚡ My Actions"), callback_data="mystats:actions")],
-        [InlineKeyboardButton(ui_get(content, "btn_team_stats", "🛠 Team Tools"), callback_data="mystats:team_hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_sharing_tools", "⬅️ Back to Sharing Tools"), callback_data="menu:affiliate_tools")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(
+        content,
+        ("btn_personal_stats", "📊 Personal Stats", "mystats:personal"),
+        ("btn_my_milestones", "🎖️ My Milestones", "mystats:milestones"),
+        ("btn_my_actions", "⚡ My Actions", "mystats:actions"),
+        ("btn_team_stats", "🛠 Team Tools", "mystats:team_hub"),
+        BACK_TO_SHARING_TOOLS_ROW,
+    )
 
 
+@cached_keyboard
 def personal_stats_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Personal Stats screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "btn_activity_help", "❓ How is this calculated?"), callback_data="mystats:activity_help")],
-        [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(
+        content,
+        ("btn_activity_help", "❓ How is this calculated?", "mystats:activity_help"),
+        BACK_TO_MY_STATS_ROW,
+    )
 
 
+@cached_keyboard
 def team_stats_hub_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Team Stats hub keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "btn_team_details", "👥 Team Details"), callback_data="mystats:team_details")],
-        [InlineKeyboardButton(ui_get(content, "btn_team_comparison", "📊 Team Comparison"), callback_data="mystats:team_comparison")],
-        [InlineKeyboardButton(ui_get(content, "btn_activity_feed", "🔔 Activity Feed"), callback_data="mystats:activity_feed")],
-        [InlineKeyboardButton(ui_get(content, "btn_member_list", "📋 Member List"), callback_data="mystats:member_list")],
-        [InlineKeyboardButton(ui_get(content, "btn_analyze_member", "🔍 Analyze Team Member"), callback_data="mystats:analyze_member")],
-        [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(
+        content,
+        ("btn_team_details", "👥 Team Details", "mystats:team_details"),
+        ("btn_team_comparison", "📊 Team Comparison", "mystats:team_comparison"),
+        ("btn_activity_feed", "🔔 Activity Feed", "mystats:activity_feed"),
+        ("btn_member_list", "📋 Member List", "mystats:member_list"),
+        ("btn_analyze_member", "🔍 Analyze Team Member", "mystats:analyze_member"),
+        BACK_TO_MY_STATS_ROW,
+    )
 
 
+@cached_keyboard
 def team_details_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Team Details screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_team_stats", "⬅️ Back to Team Stats"), callback_data="mystats:team_hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_TEAM_STATS_ROW)
 
 
+@cached_keyboard
 def team_comparison_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Team Comparison screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_team_stats", "⬅️ Back to Team Stats"), callback_data="mystats:team_hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_TEAM_STATS_ROW)
 
 
+@cached_keyboard
 def activity_feed_kb(content: Dict[str, Any], timeframe: str = "24h") -> InlineKeyboardMarkup:
     """Activity Feed screen keyboard with timeframe toggle."""
     # Create toggle buttons - highlight active one
@@ -1298,45 +1772,60 @@ def activity_feed_kb(content: Dict[str, Any], timeframe: str = "24h") -> InlineK
     ])
 
 
+@cached_keyboard
 def analyze_member_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Analyze Member screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_team_stats", "⬅️ Back to Team Stats"), callback_data="mystats:team_hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_TEAM_STATS_ROW)
 
 
+@cached_keyboard
 def member_list_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Member List screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_team_stats", "⬅️ Back to Team Stats"), callback_data="mystats:team_hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_TEAM_STATS_ROW)
+
+
+# Static callback_data used by the My Actions buttons
+CB_SHARE_INVITE = "affiliate:share_invite"
+CB_STREAK_REMINDER = "action:streak_reminder"
+CB_CONVERSION_TIPS = "action:conversion_tips"
+CB_SHARE_ACHIEVEMENT = "action:share_achievement"
+CB_WEEKLY_GOAL = "action:weekly_goal"
+CB_BEST_TIME = "action:best_time"
+
+
+@lru_cache(maxsize=4096)
+def _action_cbdata(ref_code: str) -> Dict[str, str]:
+    """Callback data for the My Actions buttons that carry the user's ref code."""
+    return {
+        "followup": f"action:followup:{ref_code}",
+        "reengage": f"action:reengage:{ref_code}",
+    }
 
 
 def my_actions_kb(content: Dict[str, Any], ref_code: str, actions: List[str]) -> InlineKeyboardMarkup:
     """My Actions screen with dynamic action buttons for all 9 suggestion types."""
     buttons = []
+    cb = _action_cbdata(ref_code)
     
     for action in actions:
         if action == "convert":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_send_followup", "📧 Send Follow-Up Template"), callback_data=f"action:followup:{ref_code}")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_send_followup", "📧 Send Follow-Up Template"), callback_data=cb["followup"])])
         elif action == "climb":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_invite", "📤 Share Invite Link"), callback_data="affiliate:share_invite")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_invite", "📤 Share Invite Link"), callback_data=CB_SHARE_INVITE)])
         elif action == "streak":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_come_back", "🔥 Come Back Tomorrow"), callback_data="action:streak_reminder")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_come_back", "🔥 Come Back Tomorrow"), callback_data=CB_STREAK_REMINDER)])
         elif action == "quality":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_conversion_tips", "📚 Learn Conversion Tips"), callback_data="action:conversion_tips")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_conversion_tips", "📚 Learn Conversion Tips"), callback_data=CB_CONVERSION_TIPS)])
         elif action == "milestone":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_to_goal", "📤 Share to Reach Goal"), callback_data="affiliate:share_invite")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_to_goal", "📤 Share to Reach Goal"), callback_data=CB_SHARE_INVITE)])
         elif action == "reengage":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_reengage_message", "📧 Send Re-engagement Message"), callback_data=f"action:reengage:{ref_code}")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_reengage_message", "📧 Send Re-engagement Message"), callback_data=cb["reengage"])])
         elif action == "celebrate":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_achievement", "📣 Share Achievement"), callback_data="action:share_achievement")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_share_achievement", "📣 Share Achievement"), callback_data=CB_SHARE_ACHIEVEMENT)])
         elif action == "weekly_goal":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_set_goal", "⚡ Set Weekly Goal"), callback_data="action:weekly_goal")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_set_goal", "⚡ Set Weekly Goal"), callback_data=CB_WEEKLY_GOAL)])
         elif action == "best_time":
-            buttons.append([InlineKeyboardButton(ui_get(content, "btn_set_reminder", "⏰ Set Reminder"), callback_data="action:best_time")])
+            buttons.append([InlineKeyboardButton(ui_get(content, "btn_set_reminder", "⏰ Set Reminder"), callback_data=CB_BEST_TIME)])
     
     buttons.append([InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:hub")])
     buttons.append([InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")])
@@ -1344,14 +1833,39 @@ def my_actions_kb(content: Dict[str, Any], ref_code: str, actions: List[str]) ->
     return InlineKeyboardMarkup(buttons)
 
 
+@cached_keyboard
 def my_milestones_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """My Milestones screen keyboard."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:hub")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_MY_STATS_ROW)
 
 
+@cached_keyboard
+def action_detail_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Keyboard under a My Actions tip or reminder."""
+    return build_submenu(content, BACK_TO_MY_ACTIONS_ROW)
+
+
+def action_template_kb(content: Dict[str, Any], invite_link: str) -> InlineKeyboardMarkup:
+    """Keyboard under a My Actions message template: copy the invite link, then go back.
+
+    Not cached: the invite link is per affiliate, so the cache would grow without bound.
+    """
+    rows = [[InlineKeyboardButton("📋 Copy Link", url=invite_link)]]
+    rows.extend(action_detail_kb(content).inline_keyboard)
+    return InlineKeyboardMarkup(rows)
+
+
+@cached_keyboard
+def share_achievement_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Keyboard under the Share Achievement message."""
+    return build_submenu(
+        content,
+        ("btn_view_share_templates", "💬 Use Share Templates Instead", "share_tpl:choose"),
+        BACK_TO_MY_ACTIONS_ROW,
+    )
+
+
+@cached_keyboard
 def activity_help_popup_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Activity score help popup keyboard."""
     return InlineKeyboardMarkup([
@@ -1359,6 +1873,7 @@ def activity_help_popup_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard
 def share_template_styles_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Keyboard for choosing share template style."""
     return InlineKeyboardMarkup([
@@ -1423,6 +1938,7 @@ def ref_links_help_kb(content: Dict[str, Any], help_url: str) -> InlineKeyboardM
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def my_invite_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Keyboard for My Invite Link submenu with three options."""
     return InlineKeyboardMarkup([
@@ -1433,15 +1949,17 @@ def my_invite_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard
 def check_ref_links_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Keyboard for Check My Referral Links screen with share button."""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(ui_get(content, "share_invite_btn", "📤 Share My Invite Link"), callback_data="invite:share")],
-        [InlineKeyboardButton(ui_get(content, "back_to_sharing_tools", "⬅️ Back to Sharing Tools"), callback_data="menu:affiliate_tools")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(
+        content,
+        ("share_invite_btn", "📤 Share My Invite Link", "invite:share"),
+        BACK_TO_SHARING_TOOLS_ROW,
+    )
 
 
+@cached_keyboard
 def affiliate_tools_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     """Keyboard for Sharing Tools submenu."""
     return InlineKeyboardMarkup([
@@ -1490,6 +2008,7 @@ def ref_invalid_link_kb(content: Dict[str, Any], step: str = "generic") -> Inlin
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def join_home_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(ui_get(content, "join_step1_btn", "🤝 Step One – Register and Trade"), callback_data="join:step1")],
@@ -1510,6 +2029,7 @@ def join_step1_kb(content: Dict[str, Any], sponsor_step1_url: Optional[str], ste
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def join_step2_locked_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(ui_get(content, "join_go_step1", "➡️ Go to Step 1"), callback_data="join:step1")],
@@ -1518,6 +2038,7 @@ def join_step2_locked_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     ])
 
 
+@cached_keyboard
 def join_step2_ack_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(ui_get(content, "join_step2_ack_btn", "✅ I understand this warning"), callback_data="join:ack_step2_warning")],
@@ -1537,6 +2058,7 @@ def join_step2_kb(content: Dict[str, Any], sponsor_step2_url: Optional[str], ste
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def language_kb(all_content: Dict[str, Any], active_lang: str) -> InlineKeyboardMarkup:
     languages = all_content.get("languages", {})
     rows: List[List[InlineKeyboardButton]] = []
@@ -1583,11 +2105,9 @@ def faq_answer_kb(content: Dict[str, Any], topic_id: str, item: Dict[str, Any])
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def faq_search_result_kb(content: Dict[str, Any]) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("⬅️ Back to topics", callback_data="faq_back_topics")],
-        [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-    ])
+    return build_submenu(content, BACK_TO_FAQ_TOPICS_ROW)
 
 
 def flatten_faq_topics(faq_topics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -1615,8 +2135,47 @@ async def safe_show_menu_message(query, context: ContextTypes.DEFAULT_TYPE, text
                 logger.error("All message sending attempts failed: %s", e3)
 
 
-def get_sponsor_welcome_stats(sponsor_code: str) -> Optional[Dict[str, Any]]:
-    """Get sponsor stats for personalized welcome message."""
+def set_link_flow(context: ContextTypes.DEFAULT_TYPE, step1: bool, step2: bool) -> None:
+    """Set which referral link the flow is waiting for.
+
+    Any change of stage forgets the last retry message, so a later retry never edits a
+    message from an earlier (or cancelled) attempt that now sits above the user's paste.
+    """
+    context.user_data["awaiting_step1_url"] = step1
+    context.user_data["awaiting_step2_url"] = step2
+    context.user_data.pop("_last_bot_msg", None)
+
+
+async def reply_flow_retry(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str, text: str, reply_markup: InlineKeyboardMarkup) -> None:
+    """Answer a bad paste in the link flow, reusing our last retry message of the same kind.
+
+    A changed text is edited into that message. An unchanged text would leave nothing new on
+    screen, so the old message is deleted and posted again below the user's paste instead.
+    """
+    last = context.user_data.get("_last_bot_msg")
+    if last and last[0] == kind:
+        _, last_message_id, last_text = last
+        chat_id = update.effective_chat.id
+        if last_text != text:
+            try:
+                await context.bot.edit_message_text(
+                    chat_id=chat_id, message_id=last_message_id, text=text, reply_markup=reply_markup
+                )
+                context.user_data["_last_bot_msg"] = (kind, last_message_id, text)
+                return
+            except Exception as e:
+                logger.warning("edit_message_text failed, sending new message instead: %s", e)
+        else:
+            try:
+                await context.bot.delete_message(chat_id=chat_id, message_id=last_message_id)
+            except Exception as e:
+                logger.debug("Could not delete previous retry message: %s", e)
+    sent = await update.message.reply_text(text, reply_markup=reply_markup)
+    context.user_data["_last_bot_msg"] = (kind, sent.message_id, text)
+
+
+def _sync_get_sponsor_welcome_stats(sponsor_code: str) -> Optional[Dict[str, Any]]:
+    """Get sponsor stats for personalized welcome message (blocking)."""
     conn = db_connect()
     cur = conn.cursor()
     
@@ -1628,19 +2187,19 @@ def get_sponsor_welcome_stats(sponsor_code: str) -> Optional[Dict[str, Any]]:
         conn.close()
         return None
     
-    owner_id = sponsor["owner_telegram_id"]
+    owner_id = sponsor[0]
     
     # Get team size (total who clicked this sponsor's link)
-    cur.execute("SELECT COUNT(*) as count FROM users WHERE sponsor_code = ?", (sponsor_code,))
-    team_size = cur.fetchone()["count"]
+    cur.execute("SELECT COUNT(*) FROM users WHERE sponsor_code = ?", (sponsor_code,))
+    team_size = cur.fetchone()[0]
     
     # Get team with links (people positioned for affiliate income)
     cur.execute("""
-        SELECT COUNT(*) as count FROM users u
+        SELECT COUNT(*) FROM users u
         LEFT JOIN referrers r ON u.telegram_user_id = r.owner_telegram_id
         WHERE u.sponsor_code = ? AND r.ref_code IS NOT NULL
     """, (sponsor_code,))
-    team_with_links = cur.fetchone()["count"]
+    team_with_links = cur.fetchone()[0]
     
     conn.close()
     
@@ -1651,6 +2210,11 @@ def get_sponsor_welcome_stats(sponsor_code: str) -> Optional[Dict[str, Any]]:
     }
 
 
+async def get_sponsor_welcome_stats(sponsor_code: str) -> Optional[Dict[str, Any]]:
+    """Get sponsor stats for personalized welcome message without blocking the event loop."""
+    return await asyncio.to_thread(_sync_get_sponsor_welcome_stats, sponsor_code)
+
+
 async def build_personalized_welcome(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -1664,66 +2228,82 @@ async def build_personalized_welcome(
     first_name_with_comma = f", {first_name}" if first_name else ""
     user_id = update.effective_user.id
     
-    # No sponsor - generic welcome
-    if not sponsor_code:
-        template = ui_get(content, "welcome_generic", "Welcome!")
-        message = template.replace("{first_name_with_comma}", first_name_with_comma).replace("{first_name}", first_name or "there")
-    else:
-        # Get sponsor stats
-        stats = get_sponsor_welcome_stats(sponsor_code)
-        
-        if not stats:
-            # Invalid sponsor code - generic welcome
+    # Progress lookup is independent of the sponsor lookups, so run it alongside them
+    progress_task = asyncio.create_task(asyncio.to_thread(get_progress_percentage, user_id))
+    
+    try:
+        # No sponsor - generic welcome
+        if not sponsor_code:
             template = ui_get(content, "welcome_generic", "Welcome!")
-            message = template.replace("{first_name_with_comma}", first_name_with_comma).replace("{first_name}", first_name or "there")
+            message = fill_template(template, first_name_with_comma=first_name_with_comma, first_name=first_name or "there")
         else:
-            # Get sponsor's Telegram info
-            try:
-                sponsor_user = await context.bot.get_chat(stats["owner_telegram_id"])
-                sponsor_first_name = sponsor_user.first_name or "Your sponsor"
-                sponsor_last_name = sponsor_user.last_name or ""
-                sponsor_username = f"@{sponsor_user.username}" if sponsor_user.username else ""
-                
-                # Build full name
-                sponsor_name = sponsor_first_name
-                if sponsor_last_name:
-                    sponsor_name += f" {sponsor_last_name}"
-                if sponsor_username:
-                    sponsor_name += f" {sponsor_username}"
-            except Exception:
-                sponsor_first_name = "Your sponsor"
-                sponsor_name = "Your sponsor"
+            # Get sponsor stats
+            stats = await get_sponsor_welcome_stats(sponsor_code)
             
-            # Choose template based on team_with_links count
-            if stats["team_with_links"] >= 10:
-                # Large team - show stats
-                template = ui_get(content, "welcome_large_team", "Welcome!")
-                message = template.replace("{first_name}", first_name or "there")
-                message = message.replace("{sponsor_name}", sponsor_name)
-                message = message.replace("{sponsor_first_name}", sponsor_first_name)
-                message = message.replace("{team_with_links}", str(stats["team_with_links"]))
-                message = message.replace("{team_size}", str(stats["team_size"]))
+            if not stats:
+                # Invalid sponsor code - generic welcome
+                template = ui_get(content, "welcome_generic", "Welcome!")
+                message = fill_template(template, first_name_with_comma=first_name_with_comma, first_name=first_name or "there")
             else:
-                # Small team - encouraging message
-                template = ui_get(content, "welcome_small_team", "Welcome!")
-                message = template.replace("{first_name}", first_name or "there")
-                message = message.replace("{sponsor_name}", sponsor_name)
-                message = message.replace("{sponsor_first_name}", sponsor_first_name)
+                # Get sponsor's Telegram info
+                try:
+                    sponsor_user = await context.bot.get_chat(stats["owner_telegram_id"])
+                    sponsor_first_name = sponsor_user.first_name or "Your sponsor"
+                    sponsor_last_name = sponsor_user.last_name or ""
+                    sponsor_username = f"@{sponsor_user.username}" if sponsor_user.username else ""
+                    
+                    # Build full name
+                    sponsor_name = sponsor_first_name
+                    if sponsor_last_name:
+                        sponsor_name += f" {sponsor_last_name}"
+                    if sponsor_username:
+                        sponsor_name += f" {sponsor_username}"
+                except Exception:
+                    sponsor_first_name = "Your sponsor"
+                    sponsor_name = "Your sponsor"
+                
+                # Choose template based on team_with_links count
+                if stats["team_with_links"] >= 10:
+                    # Large team - show stats
+                    template = ui_get(content, "welcome_large_team", "Welcome!")
+                    message = fill_template(
+                        template,
+                        first_name=first_name or "there",
+                        sponsor_name=sponsor_name,
+                        sponsor_first_name=sponsor_first_name,
+                        team_with_links=stats["team_with_links"],
+                        team_size=stats["team_size"],
+                    )
+                else:
+                    # Small team - encouraging message
+                    template = ui_get(content, "welcome_small_team", "Welcome!")
+                    message = fill_template(
+                        template,
+                        first_name=first_name or "there",
+                        sponsor_name=sponsor_name,
+                        sponsor_first_name=sponsor_first_name,
+                    )
+    except BaseException:
+        # Still collect the progress lookup so its task is never left unawaited
+        await asyncio.gather(progress_task, return_exceptions=True)
+        raise
     
     # Add progress bar if user has links and < 100% complete
-    progress = get_user_progress(user_id)
-    percentage = calculate_progress_percentage(progress, user_id)
+    percentage = await progress_task
     
     if percentage < 100 and percentage > 0:
         filled = int(percentage / 10)
         empty = 10 - filled
         progress_bar = "🟦" * filled + "⬜" * empty
-        progress_text = f"\n\n━━━━━━━━━━━━━━━━━━━━━━\n\n🎯 Your Journey: {percentage}% Complete\n{progress_bar}"
+        progress_text = f"\n\n{PROGRESS_RULE}\n\n🎯 Your Journey: {percentage}% Complete\n{progress_bar}"
         message = message + progress_text
     
     return message
 
 
+SPONSOR_CODE_RE = re.compile(r"[A-Z0-9]{4,12}$", re.ASCII)
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     db_init()
     all_content = load_all_content()
@@ -1731,24 +2311,35 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     sponsor_code = None
     if context.args and len(context.args) > 0:
         sponsor_code = (context.args[0] or "").strip().upper()
-        if not re.match(r"^[A-Z0-9]{4,12}$", sponsor_code):
+        if not SPONSOR_CODE_RE.match(sponsor_code):
             sponsor_code = None
 
+    # Save the user in the background; the welcome message counts the sponsor's
+    # team (which may now include this user), so it waits for this task first.
+    upsert_task = None
     if update.effective_user:
-        upsert_user(update.effective_user.id, sponsor_code=sponsor_code)
+        upsert_task = asyncio.create_task(
+            asyncio.to_thread(upsert_user, update.effective_user.id, sponsor_code=sponsor_code)
+        )
 
-    # Check and show update notification if needed
-    await check_and_show_update_notification(update, context, all_content)
+    # The task is awaited on every way out, including errors in the replies below
+    try:
+        # Check and show update notification if needed
+        await check_and_show_update_notification(update, context, all_content)
 
-    if not user_has_selected_lang(context, all_content):
-        default_lang = get_default_lang(all_content)
-        default_block = all_content.get("languages", {}).get(default_lang, {})
-        title = ui_get(default_block, "language_title", "🌍 Language\n\nChoose your language:")
-        await update.message.reply_text(title, reply_markup=language_kb(all_content, active_lang=default_lang))
-        return
+        if not user_has_selected_lang(context, all_content):
+            default_lang = get_default_lang(all_content)
+            default_block = all_content.get("languages", {}).get(default_lang, {})
+            title = ui_get(default_block, "language_title", "🌍 Language\n\nChoose your language:")
+            await update.message.reply_text(title, reply_markup=language_kb(all_content, active_lang=default_lang))
+            return
 
-    content = get_active_content(context, all_content)
-    context.user_data["faq_search_mode"] = False
+        content = get_active_content(context, all_content)
+        context.user_data["faq_search_mode"] = False
+    finally:
+        if upsert_task:
+            # A code merged into another one is welcomed as the code it now points to
+            sponsor_code = await upsert_task
     
     # Build personalized welcome message
     welcome_message = await build_personalized_welcome(update, context, content, sponsor_code)
@@ -1782,8 +2373,10 @@ async def adminstats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # User is owner - generate statistics
     try:
-        stats = get_admin_statistics()
-        performers = get_top_performers(limit=10)
+        refresh = bool(context.args) and context.args[0].lower() == "refresh"
+        (stats, performers), generated_at = await asyncio.to_thread(get_admin_dashboard_data_cached, 10, refresh)
+        data_age = int((datetime.now() - generated_at).total_seconds())
+        updated = "Just now" if data_age < 1 else f"cached {data_age}s ago, use /adminstats refresh"
         
         # Calculate conversion rates
         visitor_to_links = (stats["users_with_links"] / stats["total_users"] * 100) if stats["total_users"] > 0 else 0
@@ -1791,12 +2384,12 @@ async def adminstats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         links_to_step1 = (stats["step1_confirmed"] / stats["users_with_links"] * 100) if stats["users_with_links"] > 0 else 0
         
         # Build the report
-        report = f"""📊 **Pandora AI Bot Analytics**
-Generated: {datetime.now().strftime('%b %d, %Y %I:%M %p')}
+        parts: List[str] = [f"""📊 **Pandora AI Bot Analytics**
+Generated: {generated_at.strftime('%b %d, %Y %I:%M %p')}
 
-{'═'*35}
+{REPORT_DIVIDER}
 👥 **USER STATISTICS**
-{'═'*35}
+{REPORT_DIVIDER}
 Total Unique Users: **{stats['total_users']:,}**
 ├─ Generic Bot Visitors: {stats['generic_visitors']:,} ({stats['generic_visitors']/stats['total_users']*100:.0f}%)
 └─ Via Referral Link: {stats['referred_users']:,} ({stats['referred_users']/stats['total_users']*100:.0f}%)
@@ -1805,10 +2398,10 @@ Users Who Set Links: **{stats['users_with_links']:,}** ({visitor_to_links:.1f}%)
 ├─ Confirmed Step 1: {stats['step1_confirmed']:,} ({links_to_step1:.0f}%)
 └─ Acknowledged Step 2: {stats['step2_ack']:,}
 
-{'═'*35}
+{REPORT_DIVIDER}
 🏆 **TOP 10 PERFORMERS** (by team size)
-{'═'*35}
-"""
+{REPORT_DIVIDER}
+"""]
         
         # Get user info for top performers
         if performers:
@@ -1835,19 +2428,12 @@ Users Who Set Links: **{stats['users_with_links']:,}** ({visitor_to_links:.1f}%)
                 step1_percentage = (team_step1_confirmed / team_size * 100) if team_size > 0 else 0
                 
                 # Calculate Activity Score (0-5 stars based on engagement)
-                # Factors: set links %, step1 confirmed %
-                activity_score = 0
-                if links_percentage >= 60: activity_score += 2
-                elif links_percentage >= 40: activity_score += 1.5
-                elif links_percentage >= 20: activity_score += 1
-                
-                if step1_percentage >= 60: activity_score += 2
-                elif step1_percentage >= 40: activity_score += 1.5
-                elif step1_percentage >= 20: activity_score += 1
-                
-                # Add bonus for large teams
-                if team_size >= 30: activity_score += 0.5
-                elif team_size >= 20: activity_score += 0.3
+                # Factors: set links %, step1 confirmed %, plus a bonus for large teams
+                activity_score = (
+                    step_score(links_percentage, ADMIN_ENGAGEMENT_THRESHOLDS, ADMIN_ENGAGEMENT_SCORES)
+                    + step_score(step1_percentage, ADMIN_ENGAGEMENT_THRESHOLDS, ADMIN_ENGAGEMENT_SCORES)
+                    + step_score(team_size, ADMIN_TEAM_BONUS_THRESHOLDS, ADMIN_TEAM_BONUS_SCORES)
+                )
                 
                 # Cap at 5 stars
                 activity_score = min(5, activity_score)
@@ -1856,58 +2442,58 @@ Users Who Set Links: **{stats['users_with_links']:,}** ({visitor_to_links:.1f}%)
                     stars += "½"
                 
                 # Build performer entry
-                report += f"{i}. {performer['ref_code']} - {display_name}\n"
-                report += f"   • Team Size: **{team_size}**"
+                parts.append(f"{i}. {performer['ref_code']} - {display_name}\n")
+                parts.append(f"   • Team Size: **{team_size}**")
                 
                 # Add growth indicator if available
                 if has_growth_data and team_growth_7d > 0:
-                    report += f" (+{team_growth_7d} this week)"
+                    parts.append(f" (+{team_growth_7d} this week)")
                 
-                report += "\n"
-                report += f"   • Set Links: **{team_with_links}** ({links_percentage:.0f}%)\n"
-                report += f"   • Confirmed Step 1: **{team_step1_confirmed}** ({step1_percentage:.0f}%)\n"
-                report += f"   • Team Activity: {stars} ({activity_score:.1f}/5)\n"
+                parts.append("\n")
+                parts.append(f"   • Set Links: **{team_with_links}** ({links_percentage:.0f}%)\n")
+                parts.append(f"   • Confirmed Step 1: **{team_step1_confirmed}** ({step1_percentage:.0f}%)\n")
+                parts.append(f"   • Team Activity: {stars} ({activity_score:.1f}/5)\n")
                 
                 if i < len(performers):
-                    report += "\n"
+                    parts.append("\n")
         else:
-            report += "No referrers yet.\n\n"
+            parts.append("No referrers yet.\n\n")
         
-        report += f"""
-{'═'*35}
+        parts.append(f"""
+{REPORT_DIVIDER}
 📈 **CONVERSION RATES**
-{'═'*35}
+{REPORT_DIVIDER}
 Visitor → Set Links: {visitor_to_links:.1f}%
 Visitor → Confirm Step 1: {visitor_to_step1:.1f}%
 Set Links → Confirm Step 1: {links_to_step1:.1f}%
 
-{'═'*35}
+{REPORT_DIVIDER}
 📅 **RECENT ACTIVITY**
-{'═'*35}
-"""
+{REPORT_DIVIDER}
+""")
         
         if stats.get('has_time_tracking', False):
-            report += f"""**Last 24 Hours:**
+            parts.append(f"""**Last 24 Hours:**
 • New Users: {stats['users_24h']}
 • New Link Setups: {stats['links_24h']}
 
 **Last 7 Days:**
 • New Users: {stats['users_7d']}
 • New Link Setups: {stats['links_7d']}
-"""
+""")
         else:
-            report += """**Time-based tracking not available yet.**
+            parts.append("""**Time-based tracking not available yet.**
 New users will be tracked from now on.
 Check back tomorrow for 24h/7d stats!
-"""
+""")
         
-        report += f"""
-{'─'*35}
-Updated: Just now
-"""
+        parts.append(f"""
+{REPORT_RULE}
+Updated: {updated}
+""")
         
         # Send report to admin
-        await update.message.reply_text(report, parse_mode='Markdown')
+        await update.message.reply_text("".join(parts), parse_mode='Markdown')
         
     except Exception as e:
         # Show any errors that occur
@@ -1918,104 +2504,117 @@ Updated: Just now
         )
 
 
-async def send_daily_report(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Send daily report to admin users (scheduled task)."""
-    logger.info("=" * 50)
-    logger.info("DAILY REPORT: Starting execution")
-    logger.info("=" * 50)
-    
-    db_init()
-    
-    # Get admin IDs
-    admin_ids_str = os.getenv("ADMIN_USER_IDS", "")
-    logger.info(f"ADMIN_USER_IDS env var: {admin_ids_str}")
-    
-    if not admin_ids_str:
-        logger.error("DAILY REPORT: No ADMIN_USER_IDS found in environment!")
-        return
-    
-    try:
-        admin_ids = [int(id.strip()) for id in admin_ids_str.split(",") if id.strip()]
-        logger.info(f"DAILY REPORT: Parsed admin IDs: {admin_ids}")
-    except ValueError as e:
-        logger.error(f"DAILY REPORT: Failed to parse admin IDs: {e}")
-        return
-    
-    # Get statistics
-    try:
-        stats = get_admin_statistics()
-        logger.info(f"DAILY REPORT: Retrieved stats: {stats}")
-    except Exception as e:
-        logger.error(f"DAILY REPORT: Failed to get statistics: {e}", exc_info=True)
-        return
-    
-    # Build daily report with Yesterday's Activity first
-    report = f"""📊 **Daily Pandora AI Bot Report**
+def render_daily_report(stats: Dict[str, Any]) -> str:
+    """Render the scheduled daily admin report from get_admin_statistics() data."""
+    parts: List[str] = [f"""📊 **Daily Pandora AI Bot Report**
 {datetime.now().strftime('%A, %B %d, %Y')}
 
-"""
+"""]
     
     # Yesterday's Activity FIRST (at top)
     if stats.get('has_time_tracking', False):
-        report += f"""{'═'*35}
+        parts.append(f"""{REPORT_DIVIDER}
 📈 **YESTERDAY'S ACTIVITY**
-{'═'*35}
+{REPORT_DIVIDER}
 Total Unique Visitors: **{stats['users_24h']}**
 Generic Bot Visitors: {stats['generic_24h']}
 Via Referral Link: {stats['referred_24h']}
 Users Who Set Links: **{stats['links_24h']}**
 
-"""
+""")
     else:
-        report += f"""{'═'*35}
+        parts.append(f"""{REPORT_DIVIDER}
 📈 **YESTERDAY'S ACTIVITY**
-{'═'*35}
+{REPORT_DIVIDER}
 Time tracking not yet available.
 New users will be tracked from now on.
 
-"""
+""")
     
     # Current Totals SECOND
-    report += f"""{'═'*35}
+    parts.append(f"""{REPORT_DIVIDER}
 📊 **CURRENT TOTALS**
-{'═'*35}
+{REPORT_DIVIDER}
 Total Unique Visitors: **{stats['total_users']:,}**
 Generic Bot Visitors: {stats['generic_visitors']:,}
 Via Referral Link: {stats['referred_users']:,}
 Users Who Set Links: **{stats['users_with_links']:,}**
 
-"""
+""")
     
     # Weekly Progress THIRD (if time tracking available)
     if stats.get('has_time_tracking', False):
-        report += f"""{'═'*35}
+        parts.append(f"""{REPORT_DIVIDER}
 📅 **WEEKLY PROGRESS**
-{'═'*35}
+{REPORT_DIVIDER}
 New Users (7 days): **{stats['users_7d']}**
 New Links (7 days): **{stats['links_7d']}**
 
-"""
+""")
     
-    report += f"""{'─'*35}
+    parts.append(f"""{REPORT_RULE}
 Use /adminstats for detailed analytics
-"""
+""")
+    return "".join(parts)
+
+
+# Daily report fan-out: send concurrently in batches to stay under Telegram's ~30 msg/s limit
+BROADCAST_BATCH_SIZE = 25
+BROADCAST_BATCH_DELAY = 1.1
+
+
+async def send_report_to_admin(context: ContextTypes.DEFAULT_TYPE, admin_id: int, report: str) -> bool:
+    """Send the daily report to one admin. Returns True on success."""
+    try:
+        logger.info(f"DAILY REPORT: Sending to admin {admin_id}...")
+        await context.bot.send_message(
+            chat_id=admin_id,
+            text=report,
+            parse_mode='Markdown'
+        )
+        logger.info(f"DAILY REPORT: Successfully sent to admin {admin_id}")
+        return True
+    except Exception as e:
+        logger.error(f"DAILY REPORT: Failed to send to admin {admin_id}: {e}", exc_info=True)
+        return False
+
+
+async def send_daily_report(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send daily report to admin users (scheduled task)."""
+    logger.info("=" * 50)
+    logger.info("DAILY REPORT: Starting execution")
+    logger.info("=" * 50)
+    
+    db_init()
+    
+    # Get admin IDs (parsed once at startup)
+    if not REPORT_RECIPIENT_IDS:
+        logger.error("DAILY REPORT: No ADMIN_USER_IDS found in environment!")
+        return
+    
+    admin_ids = sorted(REPORT_RECIPIENT_IDS)
+    logger.info(f"DAILY REPORT: Admin IDs: {admin_ids}")
+    
+    # Get statistics
+    try:
+        stats, _ = await asyncio.to_thread(get_admin_statistics_cached)
+        logger.info(f"DAILY REPORT: Retrieved stats: {stats}")
+    except Exception as e:
+        logger.error(f"DAILY REPORT: Failed to get statistics: {e}", exc_info=True)
+        return
+    
+    report = render_daily_report(stats)
     
     logger.info(f"DAILY REPORT: Report generated, length: {len(report)} chars")
     
     # Send to all admin users
     success_count = 0
-    for admin_id in admin_ids:
-        try:
-            logger.info(f"DAILY REPORT: Sending to admin {admin_id}...")
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=report,
-                parse_mode='Markdown'
-            )
-            success_count += 1
-            logger.info(f"DAILY REPORT: Successfully sent to admin {admin_id}")
-        except Exception as e:
-            logger.error(f"DAILY REPORT: Failed to send to admin {admin_id}: {e}", exc_info=True)
+    for i in range(0, len(admin_ids), BROADCAST_BATCH_SIZE):
+        if i:
+            await asyncio.sleep(BROADCAST_BATCH_DELAY)
+        batch = admin_ids[i:i + BROADCAST_BATCH_SIZE]
+        results = await asyncio.gather(*(send_report_to_admin(context, admin_id, report) for admin_id in batch))
+        success_count += sum(results)
     
     logger.info(f"DAILY REPORT: Completed. Sent to {success_count}/{len(admin_ids)} admins")
     logger.info("=" * 50)
@@ -2026,18 +2625,11 @@ async def test_report_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     
     # Check if user is admin
-    admin_ids_str = os.getenv("ADMIN_USER_IDS", "")
-    if not admin_ids_str:
+    if not REPORT_RECIPIENT_IDS:
         await update.message.reply_text("❌ No admin users configured.")
         return
     
-    try:
-        admin_ids = [int(id.strip()) for id in admin_ids_str.split(",") if id.strip()]
-    except ValueError:
-        await update.message.reply_text("❌ Invalid ADMIN_USER_IDS configuration.")
-        return
-    
-    if user_id not in admin_ids:
+    if user_id not in REPORT_RECIPIENT_IDS:
         await update.message.reply_text("❌ This command is admin-only.")
         return
     
@@ -2277,13 +2869,7 @@ To proceed, type:
         # Check if this is confirmation
         if len(context.args) == 3 and context.args[2].upper() == "CONFIRM":
             # Execute the move
-            cur.execute("""
-                UPDATE users 
-                SET sponsor_code = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE telegram_user_id = ?
-            """, (new_sponsor_code, user_telegram_id))
-            
-            conn.commit()
+            await asyncio.to_thread(move_user_to_sponsor, user_telegram_id, new_sponsor_code)
             
             logger.info(f"ADMIN MOVE: User {user_code} (ID: {user_telegram_id}) moved from {old_sponsor} to {new_sponsor_code} by admin {user_id}")
             logger.info(f"ADMIN MOVE: Affected downline: {downline_count} members")
@@ -2628,11 +3214,7 @@ To confirm, type:
         )
         return
 
-    conn = db_connect()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE telegram_user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    await asyncio.to_thread(delete_user, user_id)
 
     context.user_data.clear()
 
@@ -2744,21 +3326,11 @@ To proceed, type:
         )
         return
     
-    # Execute reset
-    conn = db_connect()
-    cur = conn.cursor()
-    
-    # Delete from users table
-    cur.execute("DELETE FROM users WHERE telegram_user_id = ?", (target_user_id,))
-    users_deleted = cur.rowcount
-    
-    # Delete from referrers table
-    cur.execute("DELETE FROM referrers WHERE owner_telegram_id = ?", (target_user_id,))
-    refs_deleted = cur.rowcount
-    
-    conn.commit()
     conn.close()
     
+    # Execute reset: remove the user row and their referral links
+    users_deleted, refs_deleted = await asyncio.to_thread(delete_user, target_user_id, True)
+    
     await update.message.reply_text(
         f"""✅ **USER RESET COMPLETE**
 
@@ -2807,9 +3379,7 @@ async def show_sponsor_confirmation_screen(query, context, content, user_id: int
     confirm_msg = ui_get(content, "sponsor_confirm_message",
         "You are about to use referral links from your sponsor:\n\n👤 {sponsor_name}\nBot Code: {sponsor_code}\nAffiliate ID: {affiliate_id}\n\n⚠️ IMPORTANT:\nOnce confirmed, your sponsor is PERMANENT and cannot be changed.\n\n✅ Is this the correct sponsor?")
     
-    confirm_msg = confirm_msg.replace("{sponsor_name}", sponsor_name)
-    confirm_msg = confirm_msg.replace("{sponsor_code}", sponsor_code)
-    confirm_msg = confirm_msg.replace("{affiliate_id}", affiliate_id or "Unknown")
+    confirm_msg = fill_template(confirm_msg, sponsor_name=sponsor_name, sponsor_code=sponsor_code, affiliate_id=affiliate_id or "Unknown")
     
     # Build keyboard
     buttons = [
@@ -2851,8 +3421,7 @@ async def on_menu_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
     if action == "set_links":
         # Ask a confirmation question before starting link capture
-        context.user_data["awaiting_step1_url"] = False
-        context.user_data["awaiting_step2_url"] = False
+        set_link_flow(context, False, False)
         context.user_data["temp_step1_url"] = ""
         context.user_data["temp_step2_url"] = ""
 
@@ -2941,7 +3510,7 @@ async def on_menu_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         has_links = ref is not None
         
         if not progress["visited_sharing"] and has_links:
-            mark_progress_action(user_id, "visited_sharing")
+            await asyncio.to_thread(mark_progress_action, user_id, "visited_sharing")
             # Trigger celebration
             asyncio.create_task(show_progress_celebration(context, user_id, 4, content))
         
@@ -2993,8 +3562,7 @@ async def on_ref_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     data = query.data or ""
 
     if data == "ref:ready:yes" or data == "ref:have_now":
-        context.user_data["awaiting_step1_url"] = True
-        context.user_data["awaiting_step2_url"] = False
+        set_link_flow(context, True, False)
         context.user_data["temp_step1_url"] = ""
         context.user_data["temp_step2_url"] = ""
         await safe_show_menu_message(
@@ -3073,7 +3641,7 @@ async def on_invite_click(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "my_ref_links_text", 
             "📋 Here are your saved referral links:\n\n🔗 Step 1:\n{step1}\n\n🔗 Step 2:\n{step2}"
         )
-        links_text = links_template.replace("{step1}", step1_url).replace("{step2}", step2_url)
+        links_text = fill_template(links_template, step1=step1_url, step2=step2_url)
         
         title = ui_get(content, "my_ref_links_title", "🔍 Your Referral Links")
         full_text = f"{title}\n\n{links_text}"
@@ -3104,12 +3672,15 @@ async def on_invite_click(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "Your Ref Code: {ref_code}\nPeople who used your link: {total_team}"
         )
         
-        stats_text = stats_template.replace("{ref_code}", ref_code) \
-                                    .replace("{invite_link}", invite_link) \
-                                    .replace("{total_team}", str(stats["total_team"])) \
-                                    .replace("{team_with_links}", str(stats["team_with_links"])) \
-                                    .replace("{team_step1_confirmed}", str(stats["team_step1_confirmed"])) \
-                                    .replace("{growth_message}", growth_message)
+        stats_text = fill_template(
+            stats_template,
+            ref_code=ref_code,
+            invite_link=invite_link,
+            total_team=stats["total_team"],
+            team_with_links=stats["team_with_links"],
+            team_step1_confirmed=stats["team_step1_confirmed"],
+            growth_message=growth_message,
+        )
         
         title = ui_get(content, "my_team_stats_title", "📊 Your Team Stats")
         full_text = f"{title}\n\n{stats_text}"
@@ -3145,7 +3716,7 @@ async def on_affiliate_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Track sharing action (Step 5)
         progress = get_user_progress(user_id)
         if not progress["shared_invite"] and progress["visited_sharing"]:
-            mark_progress_action(user_id, "shared_invite")
+            await asyncio.to_thread(mark_progress_action, user_id, "shared_invite")
             # Trigger celebration
             asyncio.create_task(show_progress_celebration(context, user_id, 5, content))
         
@@ -3155,8 +3726,7 @@ async def on_affiliate_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     if action == "set_links":
         # Set referral links - same as menu:set_links
-        context.user_data["awaiting_step1_url"] = False
-        context.user_data["awaiting_step2_url"] = False
+        set_link_flow(context, False, False)
         context.user_data["temp_step1_url"] = ""
         context.user_data["temp_step2_url"] = ""
 
@@ -3186,7 +3756,7 @@ async def on_affiliate_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "my_ref_links_text", 
             "📋 Here are your saved referral links:\n\n🔗 Step 1:\n{step1}\n\n🔗 Step 2:\n{step2}"
         )
-        links_text = links_template.replace("{step1}", step1_url).replace("{step2}", step2_url)
+        links_text = fill_template(links_template, step1=step1_url, step2=step2_url)
         
         title = ui_get(content, "my_ref_links_title", "🔍 Your Referral Links")
         full_text = f"{title}\n\n{links_text}"
@@ -3221,12 +3791,15 @@ async def on_affiliate_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "Your Ref Code: {ref_code}\nPeople who used your link: {total_team}"
         )
         
-        stats_text = stats_template.replace("{ref_code}", ref_code) \
-                                    .replace("{invite_link}", invite_link) \
-                                    .replace("{total_team}", str(stats["total_team"])) \
-                                    .replace("{team_with_links}", str(stats["team_with_links"])) \
-                                    .replace("{team_step1_confirmed}", str(stats["team_step1_confirmed"])) \
-                                    .replace("{growth_message}", growth_message)
+        stats_text = fill_template(
+            stats_template,
+            ref_code=ref_code,
+            invite_link=invite_link,
+            total_team=stats["total_team"],
+            team_with_links=stats["team_with_links"],
+            team_step1_confirmed=stats["team_step1_confirmed"],
+            growth_message=growth_message,
+        )
         
         title = ui_get(content, "my_team_stats_title", "📊 Your Pandora AI Bot Link Stats")
         full_text = f"{title}\n\n{stats_text}"
@@ -3286,7 +3859,7 @@ async def on_join_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     if action == "confirm_sponsor_yes":
         logger.info(f"User {user_id} confirming sponsor")
         # User confirmed their sponsor
-        set_sponsor_confirmed(user_id, True)
+        await asyncio.to_thread(set_sponsor_confirmed, user_id, True)
         logger.info(f"Sponsor confirmed for user {user_id}, showing success message")
         
         # Show success message
@@ -3322,8 +3895,8 @@ async def on_join_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
 
     if action == "confirm_step1":
-        set_step1_confirmed(user_id, True)
-        set_step2_warning_ack(user_id, False)
+        await asyncio.to_thread(set_step1_confirmed, user_id, True)
+        await asyncio.to_thread(set_step2_warning_ack, user_id, False)
         await safe_show_menu_message(query, context, ui_get(content, "join_step1_confirmed", "✅ Step 1 confirmed."), join_home_kb(content))
         return
 
@@ -3345,7 +3918,7 @@ async def on_join_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
 
     if action == "ack_step2_warning":
-        set_step2_warning_ack(user_id, True)
+        await asyncio.to_thread(set_step2_warning_ack, user_id, True)
         text = ui_get(content, "join_step2_title", "🗣 Step Two – Become an Affiliate")
         if not sponsor_step2_url:
             text = ui_get(content, "join_no_sponsor_step2", "No sponsor affiliate link.")
@@ -3359,15 +3932,74 @@ def normalize(text: str) -> str:
     return " ".join(text.lower().strip().split())
 
 
-def best_faq_match(user_text: str, faq_items: List[Dict[str, Any]]) -> Tuple[int, float]:
-    user_words = set(normalize(user_text).split())
-    best_idx, best_score = -1, 0.0
+def word_set(text: str) -> Set[str]:
+    """Distinct lower-cased words of text; same result as set(normalize(text).split())."""
+    return set(text.lower().split())
+
+
+FaqIndex = Tuple[Dict[str, List[int]], List[int]]
+
+
+def build_faq_index(faq_items: List[Dict[str, Any]]) -> FaqIndex:
+    """Map each question word to the FAQ items containing it, plus each item's distinct word count."""
+    index: Dict[str, List[int]] = {}
+    q_lens: List[int] = []
     for i, item in enumerate(faq_items):
-        q_words = set(normalize(item.get("q", "")).split())
-        if not q_words:
-            continue
-        overlap = len(user_words & q_words)
-        score = overlap / max(1, len(q_words))
+        q_words = word_set(item.get("q", ""))
+        q_lens.append(len(q_words))
+        for word in q_words:
+            index.setdefault(word, []).append(i)
+    return index, q_lens
+
+
+def add_faq_search_data(content: Dict[str, Any]) -> None:
+    """Store the flattened FAQ items and their search index on a content block."""
+    faq_items = flatten_faq_topics(content.get("faq_topics", []))
+    content["_faq_items"] = faq_items
+    content["_faq_index"] = build_faq_index(faq_items)
+
+
+def get_faq_search_data(content: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], FaqIndex]:
+    """Return the flattened FAQ items and search index for a content block.
+
+    Built once per block (normally at content load) and then reused, so the text
+    handler never re-walks the FAQ tree per message.
+    """
+    if "_faq_items" not in content:
+        add_faq_search_data(content)
+    return content["_faq_items"], content["_faq_index"]
+
+
+# Chatter that never deserves an FAQ answer when typed outside search mode
+FAQ_MIN_TEXT_LEN = 3
+FAQ_SKIP_WORDS = frozenset({
+    "hi", "hey", "hello", "ok", "okay", "k", "thanks", "thx", "ty", "yes", "no",
+    "hallo", "danke", "ja", "nein",
+})
+
+
+def is_faq_chatter(text: str) -> bool:
+    """True for very short messages or ones made only of greeting/ack words."""
+    if len(text) < FAQ_MIN_TEXT_LEN:
+        return True
+    words = word_set(text.strip("!?.,"))
+    return not words or words <= FAQ_SKIP_WORDS
+
+
+def best_faq_match(user_text: str, faq_items: List[Dict[str, Any]], faq_index: Optional[FaqIndex] = None) -> Tuple[int, float]:
+    if faq_index is None:
+        faq_index = build_faq_index(faq_items)
+    index, q_lens = faq_index
+
+    # Count overlapping words only for the items that share at least one word
+    overlaps: Dict[int, int] = {}
+    for word in word_set(user_text):
+        for i in index.get(word, ()):
+            overlaps[i] = overlaps.get(i, 0) + 1
+
+    best_idx, best_score = -1, 0.0
+    for i in sorted(overlaps):
+        score = overlaps[i] / q_lens[i]
         if score > best_score:
             best_idx, best_score = i, score
     return best_idx, best_score
@@ -3439,19 +4071,86 @@ async def on_faq_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             await safe_show_menu_message(query, context, ui_get(content, "question_not_found", "Question not found."), back_to_menu_kb(content))
             return
 
-        item = questions[q_idx]
-        q = item.get("q", "Question")
-        a = item.get("a", "Answer")
-        extra = (item.get("link", "") or "").strip()
+        item = questions[q_idx]
+        q = item.get("q", "Question")
+        a = item.get("a", "Answer")
+        extra = (item.get("link", "") or "").strip()
+
+        text = f"{q}\n\n{a}"
+        if extra:
+            text += f"\n\n{ui_get(content,'more_info','More info:')} {extra}"
+
+        await safe_show_menu_message(query, context, text, faq_answer_kb(content, topic_id, item))
+        return
+
+    await safe_show_menu_message(query, context, ui_get(content, "unknown_option", "Unknown option."), back_to_menu_kb(content))
+
+
+# Link-flow pastes that get a retry message instead of advancing:
+# (awaiting step, detected type) -> (ui key, default text, keyboard builder, user_data key to stash the paste in)
+REF_FLOW_RETRIES = {
+    ("step1", "not_url"): ("ref_invalid_url", "Invalid URL.", back_to_menu_kb, None),
+    ("step1", "step2"): ("ref_detected_step2_first", "⚠️ I think you pasted your Step 2 link first.", back_to_menu_kb, "temp_step2_url"),
+    ("step1", None): ("ref_invalid_step1_text", "❌ Invalid Step 1 link. Please paste again.", lambda c: ref_invalid_link_kb(c, "step1"), None),
+    ("step2", "not_url"): ("ref_invalid_url", "Invalid URL.", back_to_menu_kb, None),
+    ("step2", "step1"): ("ref_detected_step1_in_step2", "⚠️ I think you pasted your Step 1 link here.", back_to_menu_kb, "temp_step1_url"),
+    ("step2", None): ("ref_invalid_step2_text", "❌ Invalid Step 2 link. Please paste again.", lambda c: ref_invalid_link_kb(c, "step2"), None),
+}
+
+
+async def accept_step1_url(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Dict[str, Any], msg: str, user_id: Optional[int]) -> None:
+    """Store a valid Step 1 URL; save both links if Step 2 was pasted earlier, else ask for Step 2."""
+    set_link_flow(context, False, False)
+    context.user_data["temp_step1_url"] = msg
+
+    # Check if we already have Step 2 from earlier
+    pre_step2 = (context.user_data.get("temp_step2_url") or "").strip()
+    if pre_step2 and user_id is not None:
+        ref = await asyncio.to_thread(upsert_referrer, user_id, step1_url=msg, step2_url=pre_step2)
+        context.user_data["temp_step1_url"] = ""
+        context.user_data["temp_step2_url"] = ""
+        invite = build_invite_link(ref["ref_code"], content)
+        done_tpl = ui_get(content, "ref_saved_done", "✅ Saved! {invite}")
+        done_text = fill_template(done_tpl, invite=invite)
+        await update.message.reply_text(done_text, reply_markup=build_main_menu(content))
+        return
+
+    # Prompt for Step 2
+    set_link_flow(context, False, True)
+    await update.message.reply_text(
+        ui_get(content, "ref_set_step2_prompt", "Now paste Step 2 URL:"), 
+        reply_markup=back_to_menu_kb(content)
+    )
 
-        text = f"{q}\n\n{a}"
-        if extra:
-            text += f"\n\n{ui_get(content,'more_info','More info:')} {extra}"
 
-        await safe_show_menu_message(query, context, text, faq_answer_kb(content, topic_id, item))
+async def accept_step2_url(update: Update, context: ContextTypes.DEFAULT_TYPE, content: Dict[str, Any], msg: str, user_id: Optional[int]) -> None:
+    """Save both links once a valid Step 2 URL arrives."""
+    context.user_data.pop("_last_bot_msg", None)
+    step1_url = (context.user_data.get("temp_step1_url") or "").strip()
+    if not step1_url or user_id is None:
+        set_link_flow(context, False, False)
+        await update.message.reply_text(
+            ui_get(content, "ref_flow_error", "Flow error."), 
+            reply_markup=back_to_menu_kb(content)
+        )
         return
 
-    await safe_show_menu_message(query, context, ui_get(content, "unknown_option", "Unknown option."), back_to_menu_kb(content))
+    ref = await asyncio.to_thread(upsert_referrer, user_id, step1_url=step1_url, step2_url=msg)
+    context.user_data["temp_step1_url"] = ""
+    context.user_data["temp_step2_url"] = ""
+    set_link_flow(context, False, False)
+    
+    # Update progress to Step 3 and trigger celebration
+    old_progress = get_user_progress(user_id)
+    if old_progress["progress_step"] < 3:
+        await asyncio.to_thread(update_progress_step, user_id, 3)
+        # Trigger celebration asynchronously
+        asyncio.create_task(show_progress_celebration(context, user_id, 3, content))
+    
+    invite = build_invite_link(ref["ref_code"], content)
+    done_tpl = ui_get(content, "ref_saved_done", "✅ Saved! {invite}")
+    done_text = fill_template(done_tpl, invite=invite)
+    await update.message.reply_text(done_text, reply_markup=build_main_menu(content))
 
 
 async def on_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -3505,117 +4204,28 @@ async def on_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
         return
 
-    # Handle Step 1 URL capture
-    if context.user_data.get("awaiting_step1_url") is True:
-        if not looks_like_url(msg):
-            await update.message.reply_text(
-                ui_get(content, "ref_invalid_url", "Invalid URL."), 
-                reply_markup=back_to_menu_kb(content)
-            )
-            return
-
-        url_type = detect_url_type(msg)
-
-        # User pasted Step 2 link first
-        if url_type == 'step2':
-            context.user_data["temp_step2_url"] = msg
-            await update.message.reply_text(
-                ui_get(content, "ref_detected_step2_first", "⚠️ I think you pasted your Step 2 link first."),
-                reply_markup=back_to_menu_kb(content),
-            )
-            return
-
-        # Invalid Step 1 URL
-        if url_type != 'step1':
-            await update.message.reply_text(
-                ui_get(content, "ref_invalid_step1_text", "❌ Invalid Step 1 link. Please paste again."),
-                reply_markup=ref_invalid_link_kb(content, "step1"),
-            )
-            return
-
-        # Valid Step 1 URL
-        context.user_data["temp_step1_url"] = msg
-        context.user_data["awaiting_step1_url"] = False
-
-        # Check if we already have Step 2 from earlier
-        pre_step2 = (context.user_data.get("temp_step2_url") or "").strip()
-        if pre_step2 and user_id is not None:
-            ref = upsert_referrer(user_id, step1_url=msg, step2_url=pre_step2)
-            context.user_data["temp_step1_url"] = ""
-            context.user_data["temp_step2_url"] = ""
-            context.user_data["awaiting_step2_url"] = False
-            invite = build_invite_link(ref["ref_code"], content)
-            done_tpl = ui_get(content, "ref_saved_done", "✅ Saved! {invite}")
-            done_text = done_tpl.replace("{invite}", invite)
-            await update.message.reply_text(done_text, reply_markup=build_main_menu(content))
-            return
-
-        # Prompt for Step 2
-        context.user_data["awaiting_step2_url"] = True
-        await update.message.reply_text(
-            ui_get(content, "ref_set_step2_prompt", "Now paste Step 2 URL:"), 
-            reply_markup=back_to_menu_kb(content)
-        )
-        return
-
-    # Handle Step 2 URL capture
-    if context.user_data.get("awaiting_step2_url") is True:
-        if not looks_like_url(msg):
-            await update.message.reply_text(
-                ui_get(content, "ref_invalid_url", "Invalid URL."), 
-                reply_markup=back_to_menu_kb(content)
-            )
-            return
-
-        url_type = detect_url_type(msg)
-
-        # User pasted Step 1 link here
-        if url_type == 'step1':
-            context.user_data["temp_step1_url"] = msg
-            await update.message.reply_text(
-                ui_get(content, "ref_detected_step1_in_step2", "⚠️ I think you pasted your Step 1 link here."),
-                reply_markup=back_to_menu_kb(content),
-            )
-            return
-
-        # Invalid Step 2 URL
-        if url_type != 'step2':
-            await update.message.reply_text(
-                ui_get(content, "ref_invalid_step2_text", "❌ Invalid Step 2 link. Please paste again."),
-                reply_markup=ref_invalid_link_kb(content, "step2"),
-            )
-            return
-
-        # Valid Step 2 URL - save both links
-        step1_url = (context.user_data.get("temp_step1_url") or "").strip()
-        if not step1_url or user_id is None:
-            context.user_data["awaiting_step2_url"] = False
-            await update.message.reply_text(
-                ui_get(content, "ref_flow_error", "Flow error."), 
-                reply_markup=back_to_menu_kb(content)
-            )
-            return
-
-        ref = upsert_referrer(user_id, step1_url=step1_url, step2_url=msg)
-        context.user_data["temp_step1_url"] = ""
-        context.user_data["temp_step2_url"] = ""
-        context.user_data["awaiting_step2_url"] = False
-        
-        # Update progress to Step 3 and trigger celebration
-        old_progress = get_user_progress(user_id)
-        if old_progress["progress_step"] < 3:
-            update_progress_step(user_id, 3)
-            # Trigger celebration asynchronously
-            asyncio.create_task(show_progress_celebration(context, user_id, 3, content))
-        
-        invite = build_invite_link(ref["ref_code"], content)
-        done_tpl = ui_get(content, "ref_saved_done", "✅ Saved! {invite}")
-        done_text = done_tpl.replace("{invite}", invite)
-        await update.message.reply_text(done_text, reply_markup=build_main_menu(content))
+    # Handle Step 1 / Step 2 URL capture
+    awaiting = (
+        "step1" if context.user_data.get("awaiting_step1_url") is True
+        else "step2" if context.user_data.get("awaiting_step2_url") is True
+        else None
+    )
+    if awaiting:
+        url_type = detect_url_type(msg) if looks_like_url(msg) else "not_url"
+        retry = REF_FLOW_RETRIES.get((awaiting, url_type))
+        if retry:
+            text_key, text_default, kb_builder, stash_key = retry
+            if stash_key:
+                context.user_data[stash_key] = msg
+            await reply_flow_retry(update, context, text_key, ui_get(content, text_key, text_default), kb_builder(content))
+        elif awaiting == "step1":
+            await accept_step1_url(update, context, content, msg, user_id)
+        else:
+            await accept_step2_url(update, context, content, msg, user_id)
         return
 
     # Handle FAQ search or general text matching
-    faq_items = flatten_faq_topics(content.get("faq_topics", []))
+    faq_items, faq_index = get_faq_search_data(content)
     if not faq_items:
         await update.message.reply_text(
             ui_get(content, "no_faq", "No FAQs configured."), 
@@ -3624,7 +4234,7 @@ async def on_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     if context.user_data.get("faq_search_mode") is True:
-        idx, score = best_faq_match(msg, faq_items)
+        idx, score = best_faq_match(msg, faq_items, faq_index)
         context.user_data["faq_search_mode"] = False
         if idx == -1 or score < 0.25:
             await update.message.reply_text(
@@ -3642,8 +4252,8 @@ async def on_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text(text, reply_markup=faq_search_result_kb(content))
         return
 
-    # General text matching against FAQs
-    idx, score = best_faq_match(msg, faq_items)
+    # General text matching against FAQs (greetings and one-letter pastes skip the search)
+    idx, score = (-1, 0.0) if is_faq_chatter(msg) else best_faq_match(msg, faq_items, faq_index)
     if idx == -1 or score < 0.25:
         await update.message.reply_text(
             ui_get(content, "typed_no_match", "No match."), 
@@ -3661,6 +4271,22 @@ async def on_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text(text, reply_markup=build_main_menu(content))
 
 
+# My Stats screens by callback action, each called as (query, context, content, user_id).
+# Any other "activity_*" action opens the Activity Feed.
+MYSTATS_ROUTES = {
+    "hub": lambda q, ctx, content, uid: show_mystats_hub(q, ctx, content),
+    "personal": lambda q, ctx, content, uid: show_personal_stats(q, ctx, content, uid),
+    "activity_help": lambda q, ctx, content, uid: show_activity_help(q, ctx, content, uid),
+    "team_hub": lambda q, ctx, content, uid: show_team_stats_hub(q, ctx, content),
+    "team_details": lambda q, ctx, content, uid: show_team_details(q, ctx, content, uid),
+    "team_comparison": lambda q, ctx, content, uid: show_team_comparison(q, ctx, content, uid),
+    "member_list": lambda q, ctx, content, uid: show_member_list(q, ctx, content, uid),
+    "analyze_member": lambda q, ctx, content, uid: show_analyze_member_prompt(q, ctx, content, uid),
+    "actions": lambda q, ctx, content, uid: show_my_actions(q, ctx, content, uid),
+    "milestones": lambda q, ctx, content, uid: show_my_milestones(q, ctx, content, uid),
+}
+
+
 async def on_mystats_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle My Stats menu navigation."""
     query = update.callback_query
@@ -3708,55 +4334,18 @@ async def on_mystats_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     has_links = ref is not None
     
     if not progress["visited_member_tools"] and has_links:
-        mark_progress_action(user_id, "visited_member_tools")
+        await asyncio.to_thread(mark_progress_action, user_id, "visited_member_tools")
         # Trigger celebration
         asyncio.create_task(show_progress_celebration(context, user_id, 6, content))
     
     # Route to appropriate handler
-    if action == "hub":
-        # My Stats Hub
-        await show_mystats_hub(query, context, content)
-    
-    elif action == "personal":
-        # Personal Stats
-        await show_personal_stats(query, context, content, user_id)
-    
-    elif action == "activity_help":
-        # Activity Score Help Popup
-        await show_activity_help(query, context, content, user_id)
-    
-    elif action == "team_hub":
-        # Team Stats Hub
-        await show_team_stats_hub(query, context, content)
-    
-    elif action == "team_details":
-        # Team Details screen
-        await show_team_details(query, context, content, user_id)
-    
-    elif action == "team_comparison":
-        # Team Comparison screen
-        await show_team_comparison(query, context, content, user_id)
-    
+    route = MYSTATS_ROUTES.get(action)
+    if route:
+        await route(query, context, content, user_id)
     elif action.startswith("activity_"):
         # Activity Feed screen (24h or 7d)
         timeframe = "7d" if action == "activity_7d" else "24h"
         await show_activity_feed(query, context, content, user_id, timeframe)
-    
-    elif action == "member_list":
-        # Member List screen
-        await show_member_list(query, context, content, user_id)
-    
-    elif action == "analyze_member":
-        # Analyze Team Member screen
-        await show_analyze_member_prompt(query, context, content, user_id)
-    
-    elif action == "actions":
-        # My Actions screen
-        await show_my_actions(query, context, content, user_id)
-    
-    elif action == "milestones":
-        # My Milestones screen
-        await show_my_milestones(query, context, content, user_id)
 
 
 async def show_progress_tracker(query, context, content, user_id: int):
@@ -3797,7 +4386,7 @@ async def show_progress_tracker(query, context, content, user_id: int):
     
     # Build title
     title = ui_get(content, "progress_tracker_title", "🎯 YOUR PANDORA AI JOURNEY")
-    progress_text = ui_get(content, "progress_complete", "Progress: {percent}% Complete").replace("{percent}", str(percentage))
+    progress_text = fill_template(ui_get(content, "progress_complete", "Progress: {percent}% Complete"), percent=percentage)
     
     # Build step displays
     steps_text = []
@@ -3904,8 +4493,8 @@ async def show_progress_tracker(query, context, content, user_id: int):
         next_action = ui_get(content, 'progress_step_7_desc', 'Get your first team member')
     
     # Build full message
-    separator = "━━━━━━━━━━━━━━━━━━━━━━"
-    next_action_text = ui_get(content, "progress_next_action", "Next Action: {action}").replace("{action}", next_action)
+    separator = PROGRESS_RULE
+    next_action_text = fill_template(ui_get(content, "progress_next_action", "Next Action: {action}"), action=next_action)
     
     full_message = f"{title}\n\n{progress_text}\n{progress_bar}\n\n{separator}\n\n" + "\n".join(steps_text) + f"\n{separator}\n\n{next_action_text}"
     
@@ -3985,10 +4574,10 @@ async def show_progress_celebration(context, user_id: int, step: int, content):
     
     title = ui_get(content, "progress_celebration_title", "🎊🎉 PROGRESS UPDATE! 🎉🎊")
     step_complete = ui_get(content, "progress_celebration_step_complete", "🎯 Step {step} Complete!\n{title}")
-    step_complete = step_complete.replace("{step}", str(step)).replace("{title}", step_titles.get(step, ""))
+    step_complete = fill_template(step_complete, step=step, title=step_titles.get(step, ""))
     
     percentage_text = ui_get(content, "progress_celebration_percentage", "You're {percent}% through your journey!")
-    percentage_text = percentage_text.replace("{percent}", str(percentage))
+    percentage_text = fill_template(percentage_text, percent=percentage)
     
     # Progress bar
     filled = int(percentage / 10)
@@ -3996,7 +4585,7 @@ async def show_progress_celebration(context, user_id: int, step: int, content):
     progress_bar = "🟦" * filled + "⬜" * empty
     
     unlock_text = ui_get(content, "progress_celebration_unlock", "🔓 NEW UNLOCK:\n{unlock}")
-    unlock_text = unlock_text.replace("{unlock}", unlock_messages.get(step, ""))
+    unlock_text = fill_template(unlock_text, unlock=unlock_messages.get(step, ""))
     
     # Build message
     message = f"{title}\n\n{step_complete}\n\n{percentage_text}\n{progress_bar}\n\n{unlock_text}"
@@ -4005,7 +4594,7 @@ async def show_progress_celebration(context, user_id: int, step: int, content):
     if step == 6:
         encouragement = ui_get(content, "progress_celebration_step_6_encouragement", "")
         if encouragement:
-            separator = "\n\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
+            separator = f"\n\n{PROGRESS_RULE}\n\n"
             message = message + separator + encouragement
     
     try:
@@ -4018,6 +4607,11 @@ async def show_progress_celebration(context, user_id: int, step: int, content):
         logger.warning(f"Failed to send progress celebration: {e}")
 
 
+def stats_section(title: str) -> Tuple[str, ...]:
+    """Lines that open a stats screen section: blank line, rule, title, rule."""
+    return ("", SECTION_RULE, title, SECTION_RULE)
+
+
 async def show_mystats_hub(query, context, content):
     """Show My Stats hub screen."""
     title = ui_get(content, "my_stats_hub_title", "📊 MY STATS\n\nChoose what you'd like to view:")
@@ -4027,7 +4621,7 @@ async def show_mystats_hub(query, context, content):
 async def show_personal_stats(query, context, content, user_id: int):
     """Show Personal Stats screen."""
     # Get personal stats
-    stats = get_personal_stats(user_id)
+    stats = await fetch_personal_stats(context, user_id)
     
     if not stats:
         await safe_show_menu_message(
@@ -4038,22 +4632,19 @@ async def show_personal_stats(query, context, content, user_id: int):
         )
         return
     
-    # Build the screen text
-    sections = []
-    
-    # Title
-    sections.append(ui_get(content, "personal_stats_title", "📊 YOUR PERSONAL STATS"))
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    # Build the screen text: title, then one block per section
+    sections = [ui_get(content, "personal_stats_title", "📊 YOUR PERSONAL STATS")]
     
     # Rank Section
-    sections.append(ui_get(content, "your_rank_section", "🏆 YOUR RANK"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "your_rank_section", "🏆 YOUR RANK")))
     
     rank_text = ui_get(content, "rank_display", "#{rank} of {total} affiliates\n(Top {percentage}%)")
-    rank_text = rank_text.replace("{rank}", str(stats["rank"]))
-    rank_text = rank_text.replace("{total}", str(stats["total_affiliates"]))
-    rank_text = rank_text.replace("{percentage}", str(stats["percentile"]))
+    rank_text = fill_template(
+        rank_text,
+        rank=stats["rank"],
+        total=stats["total_affiliates"],
+        percentage=stats["percentile"],
+    )
     sections.append(rank_text)
     
     # Add rank tip if applicable
@@ -4062,123 +4653,110 @@ async def show_personal_stats(query, context, content, user_id: int):
         gap = 2  # Simplified - could calculate actual gap
         unit = ui_get(content, "visitors_unit", "visitors")
         tip = ui_get(content, "rank_tip", "💡 Just {gap} more {unit} to reach #{next_rank}!")
-        tip = tip.replace("{gap}", str(gap))
-        tip = tip.replace("{unit}", unit)
-        tip = tip.replace("{next_rank}", str(next_rank))
-        sections.append("")
-        sections.append(tip)
-    
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+        tip = fill_template(
+            tip,
+            gap=gap,
+            unit=unit,
+            next_rank=next_rank,
+        )
+        sections.extend(("", tip))
     
     # Team Overview Section
-    sections.append(ui_get(content, "team_overview_section", "👥 YOUR TEAM OVERVIEW"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "team_overview_section", "👥 YOUR TEAM OVERVIEW")))
     
     visitors_text = ui_get(content, "total_visitors", "Total Unique Visitors: {count}")
-    visitors_text = visitors_text.replace("{count}", str(stats["visitors"]))
+    visitors_text = fill_template(visitors_text, count=stats["visitors"])
     sections.append(visitors_text)
     
     members_text = ui_get(content, "active_members", "Active Members: {count} ({percent}%)")
-    members_text = members_text.replace("{count}", str(stats["active_members"]))
-    members_text = members_text.replace("{percent}", str(stats["conversion"]))
+    members_text = fill_template(
+        members_text,
+        count=stats["active_members"],
+        percent=stats["conversion"],
+    )
     sections.append(members_text)
     
     # Progress bar - use success context (shows mint/aqua if 60%+)
     progress_bar = create_progress_bar(stats["conversion"], context="success")
     sections.append(progress_bar)
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # Activity Score Section
-    sections.append(ui_get(content, "activity_score_section", "⭐ TEAM ACTIVITY SCORE"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "activity_score_section", "⭐ TEAM ACTIVITY SCORE")))
     
     score_text = ui_get(content, "activity_score_display", "{stars} ({score}/5)")
-    score_text = score_text.replace("{stars}", stats["activity_stars"])
-    score_text = score_text.replace("{score}", f"{stats['activity_score']:.1f}")
+    score_text = fill_template(
+        score_text,
+        stars=stats["activity_stars"],
+        score=f"{stats['activity_score']:.1f}",
+    )
     sections.append(score_text)
     
     sections.append("")
     
     percentile_text = ui_get(content, "activity_percentile", "You're in the top {percent}% of affiliates!")
-    percentile_text = percentile_text.replace("{percent}", str(stats["percentile"]))
+    percentile_text = fill_template(percentile_text, percent=stats["percentile"])
     sections.append(percentile_text)
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # Weekly Growth Section
-    sections.append(ui_get(content, "this_week_section", "📈 THIS WEEK"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "this_week_section", "📈 THIS WEEK")))
     
     if stats["growth"]["has_time_data"]:
         new_visitors = ui_get(content, "new_visitors", "• New Visitors: {count}")
-        new_visitors = new_visitors.replace("{count}", str(stats["growth"]["visitors_7d"]))
+        new_visitors = fill_template(new_visitors, count=stats["growth"]["visitors_7d"])
         sections.append(new_visitors)
         
         new_members = ui_get(content, "new_members", "• New Members: {count}")
-        new_members = new_members.replace("{count}", str(stats["growth"]["members_7d"]))
+        new_members = fill_template(new_members, count=stats["growth"]["members_7d"])
         sections.append(new_members)
         
         # Calculate growth rate
         if stats["visitors"] > 0:
             growth_rate = int((stats["growth"]["visitors_7d"] / stats["visitors"]) * 100)
             growth_text = ui_get(content, "growth_rate", "• Growth Rate: +{percent}%")
-            growth_text = growth_text.replace("{percent}", str(growth_rate))
+            growth_text = fill_template(growth_text, percent=growth_rate)
             sections.append(growth_text)
     else:
         sections.append("• Growth tracking coming soon!")
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # 7-Day Trend
-    sections.append(ui_get(content, "trend_section", "📈 7-DAY TREND"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "trend_section", "📈 7-DAY TREND")))
     
     if stats["growth"]["has_time_data"]:
         chart = "▁▂▃▅▆█▇"  # Simplified chart
         trend_text = ui_get(content, "members_trend", "Members: {chart} (+{count} this week!)")
-        trend_text = trend_text.replace("{chart}", chart)
-        trend_text = trend_text.replace("{count}", str(stats["growth"]["members_7d"]))
+        trend_text = fill_template(
+            trend_text,
+            chart=chart,
+            count=stats["growth"]["members_7d"],
+        )
         sections.append(trend_text)
     else:
         sections.append("Trend tracking coming soon!")
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # Streak Section
-    sections.append(ui_get(content, "streak_section", "🔥 ACTIVE STREAK"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "streak_section", "🔥 ACTIVE STREAK")))
     
     if stats["streak"] > 0:
         streak_text = ui_get(content, "streak_display", "{days} days in a row!\nKeep it going! 💪")
-        streak_text = streak_text.replace("{days}", str(stats["streak"]))
+        streak_text = fill_template(streak_text, days=stats["streak"])
         sections.append(streak_text)
     else:
         sections.append(ui_get(content, "no_streak", "No active streak yet.\nCome back tomorrow to start one! 🔥"))
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # Monthly Summary
-    sections.append(ui_get(content, "monthly_section", "📅 THIS MONTH"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "monthly_section", "📅 THIS MONTH")))
     
     if stats["growth"]["has_time_data"]:
         monthly_visitors = ui_get(content, "monthly_visitors", "• Unique Visitors Added: {count}")
-        monthly_visitors = monthly_visitors.replace("{count}", str(stats["growth"]["visitors_30d"]))
+        monthly_visitors = fill_template(monthly_visitors, count=stats["growth"]["visitors_30d"])
         sections.append(monthly_visitors)
         
         monthly_members = ui_get(content, "monthly_members", "• New Members: {count}")
-        monthly_members = monthly_members.replace("{count}", str(stats["growth"]["members_30d"]))
+        monthly_members = fill_template(monthly_members, count=stats["growth"]["members_30d"])
         sections.append(monthly_members)
         
         best_week = ui_get(content, "best_week", "• Best Week: {count} new members")
-        best_week = best_week.replace("{count}", str(max(stats["growth"]["members_7d"], 1)))
+        best_week = fill_template(best_week, count=max(stats["growth"]["members_7d"], 1))
         sections.append(best_week)
     else:
         sections.append("• Monthly tracking coming soon!")
@@ -4191,7 +4769,7 @@ async def show_personal_stats(query, context, content, user_id: int):
 
 async def show_activity_help(query, context, content, user_id: int):
     """Show activity score help popup."""
-    stats = get_personal_stats(user_id)
+    stats = await fetch_personal_stats(context, user_id)
     
     if not stats:
         await query.answer("Unable to load stats", show_alert=True)
@@ -4223,12 +4801,15 @@ async def show_activity_help(query, context, content, user_id: int):
     
     # Build help text
     help_text = ui_get(content, "activity_help_text", "Activity score explanation")
-    help_text = help_text.replace("{conversion}", str(conversion))
-    help_text = help_text.replace("{conversion_stars}", f"{conversion_stars:.1f}")
-    help_text = help_text.replace("{team_size}", str(visitors))
-    help_text = help_text.replace("{size_stars}", f"{size_stars:.1f}")
-    help_text = help_text.replace("{total_score}", f"{stats['activity_score']:.1f}")
-    help_text = help_text.replace("{stars}", stats["activity_stars"])
+    help_text = fill_template(
+        help_text,
+        conversion=conversion,
+        conversion_stars=f"{conversion_stars:.1f}",
+        team_size=visitors,
+        size_stars=f"{size_stars:.1f}",
+        total_score=f"{stats['activity_score']:.1f}",
+        stars=stats["activity_stars"],
+    )
     
     title = ui_get(content, "activity_help_title", "⭐ ACTIVITY SCORE EXPLAINED")
     full_text = f"{title}\n\n{help_text}"
@@ -4244,7 +4825,7 @@ async def show_team_stats_hub(query, context, content):
 
 async def show_team_details(query, context, content, user_id: int):
     """Show Team Details screen."""
-    stats = get_personal_stats(user_id)
+    stats = await fetch_personal_stats(context, user_id)
     
     if not stats:
         await safe_show_menu_message(
@@ -4260,27 +4841,25 @@ async def show_team_details(query, context, content, user_id: int):
     # Title
     sections.append(ui_get(content, "team_details_title", "👥 TEAM DETAILS"))
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Team Composition Section
     sections.append(ui_get(content, "team_composition_section", "👥 TEAM COMPOSITION"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Build composition display
     comp_display = ui_get(content, "team_comp_display", "Total Visitors: {total}\nActive Members: {active} ({percent}%)")
     
-    # Get activity breakdown (simplified for now - would need more DB queries for real data)
-    active_24h = int(stats["active_members"] * 0.3)  # Estimate: 30% active in 24h
-    recent_7d = int(stats["active_members"] * 0.5)   # Estimate: 50% active in 7d
-    inactive = stats["visitors"] - recent_7d
-    
-    comp_display = comp_display.replace("{total}", str(stats["visitors"]))
-    comp_display = comp_display.replace("{active}", str(stats["active_members"]))
-    comp_display = comp_display.replace("{percent}", str(stats["conversion"]))
-    comp_display = comp_display.replace("{active_24h}", str(active_24h))
-    comp_display = comp_display.replace("{recent_7d}", str(recent_7d))
-    comp_display = comp_display.replace("{inactive}", str(inactive))
-    comp_display = comp_display.replace("{conversion}", str(stats["conversion"]))
+    comp_display = fill_template(
+        comp_display,
+        total=stats["visitors"],
+        active=stats["active_members"],
+        percent=stats["conversion"],
+        active_24h=stats["active_24h"],
+        recent_7d=stats["recent_7d"],
+        inactive=stats["inactive"],
+        conversion=stats["conversion"],
+    )
     
     sections.append(comp_display)
     
@@ -4289,35 +4868,41 @@ async def show_team_details(query, context, content, user_id: int):
     sections.append(progress_bar)
     
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Team Activity Section
     sections.append(ui_get(content, "team_activity_section", "👥 RECENT TEAM ACTIVITY"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Simplified activity feed (would need actual activity log for real data)
     if stats["growth"]["has_time_data"] and stats["growth"]["members_7d"] > 0:
         activity_text = ui_get(content, "became_member", "• {name} became a member ({time} ago) 🟢")
-        activity_text = activity_text.replace("{name}", "Team member")
-        activity_text = activity_text.replace("{time}", "recently")
+        activity_text = fill_template(
+            activity_text,
+            name="Team member",
+            time="recently",
+        )
         sections.append(activity_text)
         sections.append(f"• {stats['growth']['members_7d']} new members this week 🟢")
     else:
         sections.append(ui_get(content, "no_activity", "No recent activity to show."))
     
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Team Quality Section
     sections.append(ui_get(content, "team_quality_section", "👥 TEAM QUALITY"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     quality_display = ui_get(content, "quality_display", "Active Members: {active}/{total} ({percent}%)\n\nQuality Score: {stars} ({score}/5)")
-    quality_display = quality_display.replace("{active}", str(stats["active_members"]))
-    quality_display = quality_display.replace("{total}", str(stats["visitors"]))
-    quality_display = quality_display.replace("{percent}", str(stats["conversion"]))
-    quality_display = quality_display.replace("{stars}", stats["activity_stars"])
-    quality_display = quality_display.replace("{score}", f"{stats['activity_score']:.1f}")
+    quality_display = fill_template(
+        quality_display,
+        active=stats["active_members"],
+        total=stats["visitors"],
+        percent=stats["conversion"],
+        stars=stats["activity_stars"],
+        score=f"{stats['activity_score']:.1f}",
+    )
     
     sections.append(quality_display)
     
@@ -4333,7 +4918,11 @@ async def show_team_details(query, context, content, user_id: int):
 
 async def show_team_comparison(query, context, content, user_id: int):
     """Show Team Comparison screen."""
-    stats = get_personal_stats(user_id)
+    # Personal stats and platform benchmarks are independent reads; fetch them side by side
+    stats, (avg_stats, top10_stats) = await asyncio.gather(
+        fetch_personal_stats(context, user_id),
+        asyncio.to_thread(get_platform_benchmarks),
+    )
     
     if not stats:
         await safe_show_menu_message(
@@ -4344,20 +4933,16 @@ async def show_team_comparison(query, context, content, user_id: int):
         )
         return
     
-    # Get platform averages
-    avg_stats = get_average_stats()
-    top10_stats = get_top10_stats()
-    
     sections = []
     
     # Title
     sections.append(ui_get(content, "team_comparison_title", "📊 TEAM COMPARISON"))
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # VS Average Section
     sections.append(ui_get(content, "vs_average_section", "📊 VS AVERAGE AFFILIATE"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Calculate differences
     visitors_diff = stats["visitors"] - avg_stats["avg_visitors"]
@@ -4374,27 +4959,30 @@ async def show_team_comparison(query, context, content, user_id: int):
     emoji_members = "🔥" if members_diff >= 0 else "📊"
     
     vs_avg_display = ui_get(content, "vs_average_display", "Your Visitors: {your_visitors}\nAverage: {avg_visitors} visitors")
-    vs_avg_display = vs_avg_display.replace("{your_visitors}", str(stats["visitors"]))
-    vs_avg_display = vs_avg_display.replace("{avg_visitors}", str(avg_stats["avg_visitors"]))
-    vs_avg_display = vs_avg_display.replace("{percent_visitors}", str(abs(visitors_percent)))
-    vs_avg_display = vs_avg_display.replace("{above_below}", above_below_visitors)
-    vs_avg_display = vs_avg_display.replace("{emoji_visitors}", emoji_visitors)
-    vs_avg_display = vs_avg_display.replace("{your_members}", str(stats["active_members"]))
-    vs_avg_display = vs_avg_display.replace("{your_conversion}", str(stats["conversion"]))
-    vs_avg_display = vs_avg_display.replace("{avg_members}", str(avg_stats["avg_members"]))
-    vs_avg_display = vs_avg_display.replace("{avg_conversion}", str(avg_stats["avg_conversion"]))
-    vs_avg_display = vs_avg_display.replace("{percent_members}", str(abs(members_percent)))
-    vs_avg_display = vs_avg_display.replace("{above_below_members}", above_below_members)
-    vs_avg_display = vs_avg_display.replace("{emoji_members}", emoji_members)
+    vs_avg_display = fill_template(
+        vs_avg_display,
+        your_visitors=stats["visitors"],
+        avg_visitors=avg_stats["avg_visitors"],
+        percent_visitors=abs(visitors_percent),
+        above_below=above_below_visitors,
+        emoji_visitors=emoji_visitors,
+        your_members=stats["active_members"],
+        your_conversion=stats["conversion"],
+        avg_members=avg_stats["avg_members"],
+        avg_conversion=avg_stats["avg_conversion"],
+        percent_members=abs(members_percent),
+        above_below_members=above_below_members,
+        emoji_members=emoji_members,
+    )
     
     sections.append(vs_avg_display)
     
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # VS Top 10% Section
     sections.append(ui_get(content, "vs_top10_section", "📊 VS TOP 10%"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Calculate gap to top 10%
     visitors_gap = top10_stats["top10_visitors"] - stats["visitors"]
@@ -4410,15 +4998,18 @@ async def show_team_comparison(query, context, content, user_id: int):
         encouragement = ui_get(content, "keep_building", "Keep building! 💪")
     
     vs_top10_display = ui_get(content, "vs_top10_display", "Top 10% Average: {top_visitors} visitors\nYour Visitors: {your_visitors}")
-    vs_top10_display = vs_top10_display.replace("{top_visitors}", str(top10_stats["top10_visitors"]))
-    vs_top10_display = vs_top10_display.replace("{your_visitors}", str(stats["visitors"]))
-    vs_top10_display = vs_top10_display.replace("{gap_visitors}", str(max(0, visitors_gap)))
-    vs_top10_display = vs_top10_display.replace("{percent_visitors}", str(min(100, visitors_progress)))
-    vs_top10_display = vs_top10_display.replace("{top_members}", str(top10_stats["top10_members"]))
-    vs_top10_display = vs_top10_display.replace("{your_members}", str(stats["active_members"]))
-    vs_top10_display = vs_top10_display.replace("{gap_members}", str(max(0, members_gap)))
-    vs_top10_display = vs_top10_display.replace("{percent_members}", str(min(100, members_progress)))
-    vs_top10_display = vs_top10_display.replace("{encouragement}", encouragement)
+    vs_top10_display = fill_template(
+        vs_top10_display,
+        top_visitors=top10_stats["top10_visitors"],
+        your_visitors=stats["visitors"],
+        gap_visitors=max(0, visitors_gap),
+        percent_visitors=min(100, visitors_progress),
+        top_members=top10_stats["top10_members"],
+        your_members=stats["active_members"],
+        gap_members=max(0, members_gap),
+        percent_members=min(100, members_progress),
+        encouragement=encouragement,
+    )
     
     sections.append(vs_top10_display)
     
@@ -4434,11 +5025,11 @@ async def show_team_comparison(query, context, content, user_id: int):
     sections.append(progress_bar)
     
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # NEW: Insights Section
     sections.append(ui_get(content, "insights_section", "💡 YOUR INSIGHTS"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # Determine strengths and opportunities
     strengths = []
@@ -4446,7 +5037,7 @@ async def show_team_comparison(query, context, content, user_id: int):
     
     # Check conversion
     if stats["conversion"] > avg_stats["avg_conversion"]:
-        strengths.append(ui_get(content, "strength_conversion", "✅ High conversion ({yours}% vs {avg}% avg)").replace("{yours}", str(stats["conversion"])).replace("{avg}", str(avg_stats["avg_conversion"])))
+        strengths.append(fill_template(ui_get(content, "strength_conversion", "✅ High conversion ({yours}% vs {avg}% avg)"), yours=stats["conversion"], avg=avg_stats["avg_conversion"]))
     elif stats["conversion"] < avg_stats["avg_conversion"] - 10:
         opportunities.append(ui_get(content, "opp_conversion", "📈 Conversion could improve"))
     
@@ -4482,7 +5073,7 @@ async def show_team_comparison(query, context, content, user_id: int):
         
         steps = []
         if members_gap > 0:
-            steps.append(ui_get(content, "step_add_members", "1. Add {gap} more members").replace("{gap}", str(members_gap)))
+            steps.append(fill_template(ui_get(content, "step_add_members", "1. Add {gap} more members"), gap=members_gap))
         
         if stats["conversion"] < 70:
             steps.append(ui_get(content, "step_improve_conversion", "2. Improve conversion rate"))
@@ -4498,7 +5089,7 @@ async def show_team_comparison(query, context, content, user_id: int):
         
         # Highlight what they're closest in
         closest_metric = "conversion" if stats["conversion"] / avg_stats["avg_conversion"] > stats["active_members"] / avg_stats["avg_members"] else "team growth"
-        sections.append(ui_get(content, "closest_in", "💪 YOU'RE CLOSEST IN: {metric}").replace("{metric}", closest_metric.title()))
+        sections.append(fill_template(ui_get(content, "closest_in", "💪 YOU'RE CLOSEST IN: {metric}"), metric=closest_metric.title()))
         
         if closest_metric == "conversion":
             sections.append(ui_get(content, "focus_growth", "Focus on team growth next!"))
@@ -4531,9 +5122,7 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
     cur = conn.cursor()
     
     # Check if created_at exists
-    cur.execute("PRAGMA table_info(users)")
-    columns = [row["name"] for row in cur.fetchall()]
-    has_created_at = "created_at" in columns
+    has_created_at = users_has_column(cur, "created_at")
     
     if not has_created_at:
         # Fallback if no timestamps
@@ -4607,7 +5196,7 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
             created = dt.fromisoformat(member["created_at"])
             time_desc = get_relative_time(created)
             code = get_member_code(member["telegram_user_id"])
-            activities.append((created, ui_get(content, "activity_new_member", "• New member {code} joined 👋").replace("{code}", code), time_desc))
+            activities.append((created, fill_template(ui_get(content, "activity_new_member", "• New member {code} joined 👋"), code=code), time_desc))
         except:
             pass
     
@@ -4618,7 +5207,7 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
             created = dt.fromisoformat(setter["created_at"])
             time_desc = get_relative_time(created)
             code = get_member_code(setter["owner_telegram_id"])
-            activities.append((created, ui_get(content, "activity_set_links", "• {code} set referral links 🔗").replace("{code}", code), time_desc))
+            activities.append((created, fill_template(ui_get(content, "activity_set_links", "• {code} set referral links 🔗"), code=code), time_desc))
         except:
             pass
     
@@ -4629,7 +5218,7 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
             created = dt.fromisoformat(confirm["created_at"])
             time_desc = get_relative_time(created)
             code = get_member_code(confirm["telegram_user_id"])
-            activities.append((created, ui_get(content, "activity_confirmed_step1", "• {code} confirmed Step 1 ✅").replace("{code}", code), time_desc))
+            activities.append((created, fill_template(ui_get(content, "activity_confirmed_step1", "• {code} confirmed Step 1 ✅"), code=code), time_desc))
         except:
             pass
     
@@ -4640,7 +5229,7 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
     sections = []
     sections.append(title)
     sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     if activities:
         # Group by day
@@ -4658,13 +5247,13 @@ async def show_activity_feed(query, context, content, user_id: int, timeframe: s
             sections.append(activity)
         
         sections.append("")
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         
         # Summary
-        sections.append(ui_get(content, "activity_summary", "📊 SUMMARY ({timeframe})").replace("{timeframe}", "Last 7 Days" if timeframe == "7d" else "Last 24h"))
-        sections.append(ui_get(content, "activity_new_members_count", "👋 New Members: {count}").replace("{count}", str(len(new_members))))
-        sections.append(ui_get(content, "activity_links_set_count", "🔗 Links Set: {count}").replace("{count}", str(len(link_setters))))
-        sections.append(ui_get(content, "activity_step1_count", "✅ Step 1 Confirmed: {count}").replace("{count}", str(len(step1_confirmed))))
+        sections.append(fill_template(ui_get(content, "activity_summary", "📊 SUMMARY ({timeframe})"), timeframe="Last 7 Days" if timeframe == "7d" else "Last 24h"))
+        sections.append(fill_template(ui_get(content, "activity_new_members_count", "👋 New Members: {count}"), count=len(new_members)))
+        sections.append(fill_template(ui_get(content, "activity_links_set_count", "🔗 Links Set: {count}"), count=len(link_setters)))
+        sections.append(fill_template(ui_get(content, "activity_step1_count", "✅ Step 1 Confirmed: {count}"), count=len(step1_confirmed)))
     else:
         sections.append(ui_get(content, "no_recent_activity", "No activity in this timeframe yet."))
         sections.append("")
@@ -4708,28 +5297,39 @@ def get_member_code(telegram_id: int) -> str:
         return f"***{str(telegram_id)[-3:]}"
 
 
+def parse_user_ids(ids_str: str, source: str) -> FrozenSet[int]:
+    """Parse a comma-separated list of Telegram IDs (negative group/channel IDs included).
+
+    Invalid entries are logged and skipped.
+    """
+    ids = set()
+    for entry in ids_str.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            ids.add(int(entry))
+        except ValueError:
+            logger.error(f"Ignoring invalid ID {entry!r} in {source}")
+    return frozenset(ids)
+
+
+# Role membership is parsed once at startup (env vars only change on redeploy).
+# Try both possible env var names for admins for compatibility.
+ADMIN_USER_IDS = parse_user_ids(os.getenv("ADMIN_USER_IDS", "") or os.getenv("ADMIN_IDS", ""), "ADMIN_USER_IDS/ADMIN_IDS")
+OWNER_USER_IDS = parse_user_ids(os.getenv("OWNER_USER_IDS", ""), "OWNER_USER_IDS")
+# Daily report recipients (and who may trigger /testreport): ADMIN_USER_IDS only, no ADMIN_IDS fallback
+REPORT_RECIPIENT_IDS = parse_user_ids(os.getenv("ADMIN_USER_IDS", ""), "ADMIN_USER_IDS")
+
+
 def is_admin(user_id: int) -> bool:
     """Check if user is an admin (receives reports, can analyze members)."""
-    # Try both possible env var names for compatibility
-    admin_ids_str = os.getenv("ADMIN_USER_IDS", "") or os.getenv("ADMIN_IDS", "")
-    if not admin_ids_str:
-        return False
-    
-    admin_ids = [int(x.strip()) for x in admin_ids_str.split(",") if x.strip().isdigit()]
-    return user_id in admin_ids
+    return user_id in ADMIN_USER_IDS
 
 
 def is_owner(user_id: int) -> bool:
     """Check if user is an owner (full system access including moveuser, adminstats, allmembers)."""
-    owner_ids_str = os.getenv("OWNER_USER_IDS", "")
-    if not owner_ids_str:
-        return False
-    
-    try:
-        owner_ids = [int(x.strip()) for x in owner_ids_str.split(",") if x.strip().isdigit()]
-        return user_id in owner_ids
-    except (ValueError, AttributeError):
-        return False
+    return user_id in OWNER_USER_IDS
 
 
 def get_user_role(user_id: int) -> str:
@@ -4877,65 +5477,64 @@ async def show_member_analysis(message, context, content, member_code: str):
         
         sections.append(ui_get(content, "member_analysis_title", "🔍 MEMBER ANALYSIS"))
         sections.append("")
-        sections.append("━━━━━━━━━━━━━━━")
-        sections.append(ui_get(content, "member_info_section", "👤 MEMBER {code}").replace("{code}", member_code))
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
+        sections.append(fill_template(ui_get(content, "member_info_section", "👤 MEMBER {code}"), code=member_code))
+        sections.append(SECTION_RULE)
         
         # Show name if available
         if full_name:
-            sections.append(ui_get(content, "member_name", "Name: {name}").replace("{name}", full_name))
+            sections.append(fill_template(ui_get(content, "member_name", "Name: {name}"), name=full_name))
         
         # Show username if available
         if username:
-            sections.append(ui_get(content, "member_username", "Telegram: @{username}").replace("{username}", username))
+            sections.append(fill_template(ui_get(content, "member_username", "Telegram: @{username}"), username=username))
         
         # Status
         status = ui_get(content, "status_active", "✅ Active Affiliate")
-        sections.append(ui_get(content, "member_status", "Status: {status}").replace("{status}", status))
+        sections.append(fill_template(ui_get(content, "member_status", "Status: {status}"), status=status))
         sections.append("")
         
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         sections.append(ui_get(content, "performance_section", "📊 PERFORMANCE"))
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         
         # Rank
-        percentile_desc = ui_get(content, "top_percent", "Top {percent}%").replace("{percent}", str(stats["percentile"]))
-        sections.append(ui_get(content, "member_rank", "Rank: #{rank} of {total} ({percentile})").replace("{rank}", str(stats["rank"])).replace("{total}", str(stats["total_affiliates"])).replace("{percentile}", percentile_desc))
+        percentile_desc = fill_template(ui_get(content, "top_percent", "Top {percent}%"), percent=stats["percentile"])
+        sections.append(fill_template(ui_get(content, "member_rank", "Rank: #{rank} of {total} ({percentile})"), rank=stats["rank"], total=stats["total_affiliates"], percentile=percentile_desc))
         
         # Team
-        sections.append(ui_get(content, "member_team_size", "Team Members: {members}").replace("{members}", str(stats["active_members"])))
-        sections.append(ui_get(content, "member_visitors", "Unique Visitors: {visitors}").replace("{visitors}", str(stats["visitors"])))
-        sections.append(ui_get(content, "member_conversion", "Conversion: {conversion}%").replace("{conversion}", str(stats["conversion"])))
+        sections.append(fill_template(ui_get(content, "member_team_size", "Team Members: {members}"), members=stats["active_members"]))
+        sections.append(fill_template(ui_get(content, "member_visitors", "Unique Visitors: {visitors}"), visitors=stats["visitors"]))
+        sections.append(fill_template(ui_get(content, "member_conversion", "Conversion: {conversion}%"), conversion=stats["conversion"]))
         
         # Activity
-        sections.append(ui_get(content, "member_activity", "Activity Score: {stars} ({score}/5)").replace("{stars}", stats["activity_stars"]).replace("{score}", str(stats["activity_score"])))
+        sections.append(fill_template(ui_get(content, "member_activity", "Activity Score: {stars} ({score}/5)"), stars=stats["activity_stars"], score=stats["activity_score"]))
         
         sections.append("")
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         sections.append(ui_get(content, "comparison_section", "🎯 COMPARISON"))
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         
         # Get averages for comparison
-        avg_stats = get_average_stats()
-        top10_stats = get_top10_stats()
+        avg_stats, top10_stats = get_platform_benchmarks()
         
         # vs Average
         if stats["active_members"] > avg_stats["avg_members"]:
-            vs_avg = ui_get(content, "above_average", "+{percent}% above average").replace("{percent}", str(int((stats["active_members"] / avg_stats["avg_members"] - 1) * 100)))
+            vs_avg = fill_template(ui_get(content, "above_average", "+{percent}% above average"), percent=int((stats["active_members"] / avg_stats["avg_members"] - 1) * 100))
         else:
             vs_avg = ui_get(content, "below_average", "Below average")
         
-        sections.append(ui_get(content, "member_vs_avg", "vs Average: {comparison}").replace("{comparison}", vs_avg))
+        sections.append(fill_template(ui_get(content, "member_vs_avg", "vs Average: {comparison}"), comparison=vs_avg))
         
         # vs Top 10%
         progress_to_top10 = int((stats["active_members"] / top10_stats["top10_members"] * 100)) if top10_stats["top10_members"] > 0 else 0
-        sections.append(ui_get(content, "member_vs_top10", "vs Top 10%: {percent}% there").replace("{percent}", str(min(100, progress_to_top10))))
+        sections.append(fill_template(ui_get(content, "member_vs_top10", "vs Top 10%: {percent}% there"), percent=min(100, progress_to_top10)))
         
         # Insights
         sections.append("")
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         sections.append(ui_get(content, "member_insights", "💡 INSIGHTS"))
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         
         insights = []
         if stats["conversion"] > avg_stats["avg_conversion"]:
@@ -4964,7 +5563,7 @@ async def show_member_analysis(message, context, content, member_code: str):
             reply_markup=analyze_member_kb(content)
         )
     sections.append(ui_get(content, "member_insights", "💡 INSIGHTS"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     insights = []
     if stats["conversion"] > avg_stats["avg_conversion"]:
@@ -5108,8 +5707,8 @@ async def show_member_list(query, context, content, user_id: int):
         sections = []
         sections.append(ui_get(content, "member_list_title", "📋 MEMBER LIST"))
         sections.append("")
-        sections.append(ui_get(content, "member_list_count", "Total Team Members: {count}").replace("{count}", str(len(member_details))))
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(fill_template(ui_get(content, "member_list_count", "Total Team Members: {count}"), count=len(member_details)))
+        sections.append(SECTION_RULE)
         sections.append("")
         
         # Sort by depth (direct members first)
@@ -5123,7 +5722,7 @@ async def show_member_list(query, context, content, user_id: int):
                     sections.append("")
                 
                 # Depth 1 = Direct Members, Depth 2 = Level 2, etc.
-                level_name = ui_get(content, "level_direct", "DIRECT MEMBERS") if member["depth"] == 1 else ui_get(content, "level_indirect", "LEVEL {level} MEMBERS").replace("{level}", str(member["depth"]))
+                level_name = ui_get(content, "level_direct", "DIRECT MEMBERS") if member["depth"] == 1 else fill_template(ui_get(content, "level_indirect", "LEVEL {level} MEMBERS"), level=member["depth"])
                 sections.append(level_name)
                 sections.append("")
                 current_level = member["depth"]
@@ -5142,7 +5741,7 @@ async def show_member_list(query, context, content, user_id: int):
             sections.append(member_line)
         
         sections.append("")
-        sections.append("━━━━━━━━━━━━━━━")
+        sections.append(SECTION_RULE)
         sections.append(ui_get(content, "member_list_tip", "💡 Copy a code to analyze that member"))
         
         full_text = "\n".join(sections)
@@ -5182,6 +5781,26 @@ async def show_analyze_member_prompt(query, context, content, user_id: int):
     )
 
 
+async def _answer_coming_soon(query, text: str) -> None:
+    """Placeholder actions just show an alert."""
+    await query.answer(text, show_alert=True)
+
+
+# Suggestion actions by callback type, each called as (query, context, content, arg) where
+# arg is the optional third callback_data part (the ref code for followup/reengage).
+ACTION_ROUTES = {
+    "followup": lambda q, ctx, content, arg: show_followup_template(q, ctx, content, arg),
+    "streak_reminder": lambda q, ctx, content, arg: show_streak_reminder(q, ctx, content),
+    "conversion_tips": lambda q, ctx, content, arg: show_conversion_tips(q, ctx, content),
+    "reengage": lambda q, ctx, content, arg: show_reengage_template(q, ctx, content, arg),
+    "weekly_goal": lambda q, ctx, content, arg: _answer_coming_soon(q, "Weekly goal setting coming soon! 🎯"),
+    "best_time": lambda q, ctx, content, arg: _answer_coming_soon(q, "Reminder feature coming soon! ⏰"),
+    "share_achievement": lambda q, ctx, content, arg: show_share_achievement(q, ctx, content, q.from_user.id),
+}
+# Actions that do nothing without a ref code in callback_data
+REF_CODE_ACTIONS = frozenset({"followup", "reengage"})
+
+
 async def on_action_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle action button clicks for all 9 suggestion types."""
     query = update.callback_query
@@ -5197,38 +5816,11 @@ async def on_action_click(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     
     action_type = parts[1]
+    arg = parts[2] if len(parts) >= 3 else None
     
-    if action_type == "followup":
-        # Show follow-up template
-        if len(parts) >= 3:
-            ref_code = parts[2]
-            await show_followup_template(query, context, content_obj, ref_code)
-    
-    elif action_type == "streak_reminder":
-        # Show streak reminder
-        await show_streak_reminder(query, context, content_obj)
-    
-    elif action_type == "conversion_tips":
-        # Show conversion tips
-        await show_conversion_tips(query, context, content_obj)
-    
-    elif action_type == "reengage":
-        # Show re-engagement template
-        if len(parts) >= 3:
-            ref_code = parts[2]
-            await show_reengage_template(query, context, content_obj, ref_code)
-    
-    elif action_type == "weekly_goal":
-        # Show weekly goal setter (placeholder for now)
-        await query.answer("Weekly goal setting coming soon! 🎯", show_alert=True)
-    
-    elif action_type == "best_time":
-        # Show best time reminder (placeholder for now)
-        await query.answer("Reminder feature coming soon! ⏰", show_alert=True)
-    
-    elif action_type == "share_achievement":
-        # Show achievement share message
-        await show_share_achievement(query, context, content_obj, query.from_user.id)
+    route = ACTION_ROUTES.get(action_type)
+    if route and (arg is not None or action_type not in REF_CODE_ACTIONS):
+        await route(query, context, content_obj, arg)
 
 
 async def on_progress_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -5249,7 +5841,7 @@ async def on_progress_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     elif action == "confirm_step1":
         # User confirms Step 1 completion
-        mark_progress_action(user_id, "step1_confirmed")
+        await asyncio.to_thread(mark_progress_action, user_id, "step1_confirmed")
         # Show celebration
         asyncio.create_task(show_progress_celebration(context, user_id, 1, content))
         # Refresh progress tracker
@@ -5257,7 +5849,7 @@ async def on_progress_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     elif action == "confirm_step2":
         # User confirms Step 2 completion
-        mark_progress_action(user_id, "step2_confirmed")
+        await asyncio.to_thread(mark_progress_action, user_id, "step2_confirmed")
         # Show celebration
         asyncio.create_task(show_progress_celebration(context, user_id, 2, content))
         # Refresh progress tracker
@@ -5265,9 +5857,125 @@ async def on_progress_click(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 
+# Each My Actions rule returns (impact, template values) when it applies, else None.
+
+def _suggest_convert(stats, avg_stats, content):
+    # 1. CONVERT VISITORS TO MEMBERS (High Impact if < 80% conversion)
+    unconverted = stats["visitors"] - stats["active_members"]
+    if stats["conversion"] < 80 and unconverted > 0:
+        # Impact: Higher if more unconverted AND lower conversion
+        return unconverted * (100 - stats["conversion"]) / 100, {"count": unconverted}
+    return None
+
+
+def _suggest_climb(stats, avg_stats, content):
+    # 2. CLIMB LEADERBOARD (Medium-High Impact if not #1)
+    if stats["rank"] > 1:
+        # Impact: Higher if closer to top
+        return 100 - stats["percentile"], {"rank": stats["rank"] - 1}
+    return None
+
+
+def _suggest_maintain_streak(stats, avg_stats, content):
+    # 3. MAINTAIN STREAK (Medium Impact - higher with longer streaks, don't want to break)
+    if stats["streak"] > 0:
+        return min(stats["streak"] * 5, 60), {"days": stats["streak"]}
+    return None
+
+
+def _suggest_start_streak(stats, avg_stats, content):
+    # 3b. START STREAK (Medium Impact - habit building)
+    if stats["streak"] <= 0:
+        return 40, {}
+    return None
+
+
+def _suggest_quality(stats, avg_stats, content):
+    # 4. QUALITY FOCUS (High Impact if at least 10% below average)
+    conversion_gap = avg_stats["avg_conversion"] - stats["conversion"]
+    if conversion_gap >= 10:
+        # Impact: Higher the bigger the gap
+        return conversion_gap * 2, {"conversion": stats["conversion"], "average": avg_stats["avg_conversion"]}
+    return None
+
+
+# Team-size milestones shown on My Milestones and suggested on My Actions (ascending)
+TEAM_MILESTONES = (10, 25, 50, 100, 250, 500)
+
+
+def next_team_milestone(active_members: int) -> Optional[int]:
+    """Smallest milestone above the current member count, or None once all are reached."""
+    idx = bisect.bisect_right(TEAM_MILESTONES, active_members)
+    return TEAM_MILESTONES[idx] if idx < len(TEAM_MILESTONES) else None
+
+
+def _suggest_milestone(stats, avg_stats, content):
+    # 5. REACH NEXT MILESTONE (Very High Impact if within 5 of milestone)
+    milestone = next_team_milestone(stats["active_members"])
+    if milestone is not None and milestone - stats["active_members"] <= 5:
+        gap = milestone - stats["active_members"]
+        # Impact: Very high when close to milestone
+        unit = ui_get(content, "members_unit", "members")
+        return 100 - (gap * 10), {"gap": gap, "unit": unit, "milestone": milestone}
+    return None
+
+
+def _suggest_reengage(stats, avg_stats, content):
+    # 6. RE-ENGAGE INACTIVE MEMBERS (Medium-High if has inactive)
+    inactive_estimate = int((stats["visitors"] - stats["active_members"]) * 0.7)
+    if inactive_estimate >= 5:
+        # Impact: Higher with more inactive
+        return min(inactive_estimate * 3, 75), {"count": inactive_estimate}
+    return None
+
+
+# Visitor counts worth celebrating on My Actions
+CELEBRATED_VISITOR_COUNTS = frozenset({10, 25, 50, 100})
+
+
+def _suggest_celebrate(stats, avg_stats, content):
+    # 7. CELEBRATE RECENT WIN (High Impact - motivational)
+    if stats["rank"] <= 10:
+        return 80, {"achievement": f"#{stats['rank']} rank"}
+    if stats["visitors"] in CELEBRATED_VISITOR_COUNTS:
+        return 80, {"achievement": f"{stats['visitors']} visitors"}
+    return None
+
+
+def _suggest_weekly_goal(stats, avg_stats, content):
+    # 8. WEEKLY GOAL SETTING (Medium Impact - planning)
+    if stats["growth"]["has_time_data"]:
+        return 50, {"last_week": stats["growth"]["members_7d"]}
+    return None
+
+
+def _suggest_best_time(stats, avg_stats, content):
+    # 9. BEST TIME TO SHARE (Low-Medium Impact - simplified: assume 6-9 PM is best time)
+    return 35, {"time_range": "6-9 PM"}
+
+
+# (action type, rule, ui key, default text), in the order ties are shown
+ACTION_SUGGESTIONS = (
+    ("convert", _suggest_convert, "action_convert_visitors", "📧 Convert Visitors to Members\n{count} visitors haven't become members yet"),
+    ("climb", _suggest_climb, "action_climb_leaderboard", "🎯 Climb the Leaderboard\nYou're close to #{rank} rank"),
+    ("streak", _suggest_maintain_streak, "action_maintain_streak", "🔥 Maintain Your Streak\n{days} days active - keep it going!"),
+    ("streak", _suggest_start_streak, "action_start_streak", "🔥 Start Your Streak\nBuild consistency - come back daily!"),
+    ("quality", _suggest_quality, "action_quality_focus", "🎯 Improve Your Conversion\nYour conversion is {conversion}% - platform average is {average}%"),
+    ("milestone", _suggest_milestone, "action_reach_milestone", "🎖️ Almost There!\nJust {gap} more {unit} to reach {milestone} milestone"),
+    ("reengage", _suggest_reengage, "action_reengage", "💌 Re-engage Inactive Members\n{count} visitors haven't checked in this week"),
+    ("celebrate", _suggest_celebrate, "action_celebrate", "🎉 Celebrate Your Win!\nYou just reached {achievement} - share your success!"),
+    ("weekly_goal", _suggest_weekly_goal, "action_weekly_goal", "🎯 Set This Week's Goal\nLast week: +{last_week} members. What's your goal this week?"),
+    ("best_time", _suggest_best_time, "action_best_time", "⏰ Prime Sharing Time\nYour team is most active {time_range} - share then!"),
+)
+
+
 async def show_my_actions(query, context, content, user_id: int):
     """Show My Actions screen with TOP 3 most impactful smart suggestions."""
-    stats = get_personal_stats(user_id)
+    # Personal stats and platform averages are independent reads; fetch them side by side
+    stats, avg_stats = await asyncio.gather(
+        fetch_personal_stats(context, user_id),
+        asyncio.to_thread(get_average_stats),
+    )
     
     if not stats:
         await safe_show_menu_message(
@@ -5278,141 +5986,18 @@ async def show_my_actions(query, context, content, user_id: int):
         )
         return
     
-    # Get platform averages for comparison
-    avg_stats = get_average_stats()
-    
-    # Build ALL 9 suggestions with impact scores
+    # Score every suggestion rule, then render text only for the TOP 3
     all_suggestions = []
-    
-    # 1. CONVERT VISITORS TO MEMBERS (High Impact if < 80% conversion)
-    if stats["conversion"] < 80:
-        unconverted = stats["visitors"] - stats["active_members"]
-        if unconverted > 0:
-            # Impact: Higher if more unconverted AND lower conversion
-            impact = unconverted * (100 - stats["conversion"]) / 100
-            all_suggestions.append({
-                "type": "convert",
-                "impact": impact,
-                "text": ui_get(content, "action_convert_visitors", "📧 Convert Visitors to Members\n{count} visitors haven't become members yet").replace("{count}", str(unconverted)),
-                "button": "btn_send_followup"
-            })
-    
-    # 2. CLIMB LEADERBOARD (Medium-High Impact if not #1)
-    if stats["rank"] > 1:
-        # Impact: Higher if closer to top
-        impact = 100 - stats["percentile"]
-        next_rank = stats["rank"] - 1
-        all_suggestions.append({
-            "type": "climb",
-            "impact": impact,
-            "text": ui_get(content, "action_climb_leaderboard", "🎯 Climb the Leaderboard\nYou're close to #{rank} rank").replace("{rank}", str(next_rank)),
-            "button": "btn_share_invite"
-        })
-    
-    # 3. MAINTAIN/START STREAK (Medium Impact - habit building)
-    if stats["streak"] > 0:
-        # Impact: Higher with longer streaks (don't want to break)
-        impact = min(stats["streak"] * 5, 60)
-        all_suggestions.append({
-            "type": "streak",
-            "impact": impact,
-            "text": ui_get(content, "action_maintain_streak", "🔥 Maintain Your Streak\n{days} days active - keep it going!").replace("{days}", str(stats["streak"])),
-            "button": "btn_come_back"
-        })
-    else:
-        # Starting streak has medium impact
-        all_suggestions.append({
-            "type": "streak",
-            "impact": 40,
-            "text": ui_get(content, "action_start_streak", "🔥 Start Your Streak\nBuild consistency - come back daily!"),
-            "button": "btn_come_back"
-        })
-    
-    # 4. QUALITY FOCUS (High Impact if significantly below average)
-    if stats["conversion"] < avg_stats["avg_conversion"]:
-        conversion_gap = avg_stats["avg_conversion"] - stats["conversion"]
-        if conversion_gap >= 10:  # At least 10% below average
-            # Impact: Higher the bigger the gap
-            impact = conversion_gap * 2
-            all_suggestions.append({
-                "type": "quality",
-                "impact": impact,
-                "text": ui_get(content, "action_quality_focus", "🎯 Improve Your Conversion\nYour conversion is {conversion}% - platform average is {average}%").replace("{conversion}", str(stats["conversion"])).replace("{average}", str(avg_stats["avg_conversion"])),
-                "button": "btn_conversion_tips"
-            })
-    
-    # 5. REACH NEXT MILESTONE (Very High Impact if within 5 of milestone)
-    milestones = [10, 25, 50, 100, 250, 500]
-    for milestone in milestones:
-        if stats["active_members"] < milestone:
-            gap = milestone - stats["active_members"]
-            if gap <= 5:
-                # Impact: Very high when close to milestone
-                impact = 100 - (gap * 10)
-                unit = ui_get(content, "members_unit", "members")
-                all_suggestions.append({
-                    "type": "milestone",
-                    "impact": impact,
-                    "text": ui_get(content, "action_reach_milestone", "🎖️ Almost There!\nJust {gap} more {unit} to reach {milestone} milestone").replace("{gap}", str(gap)).replace("{unit}", unit).replace("{milestone}", str(milestone)),
-                    "button": "btn_share_to_goal"
-                })
-            break
-    
-    # 6. RE-ENGAGE INACTIVE MEMBERS (Medium-High if has inactive)
-    if stats["visitors"] > stats["active_members"]:
-        inactive_estimate = int((stats["visitors"] - stats["active_members"]) * 0.7)
-        if inactive_estimate >= 5:
-            # Impact: Higher with more inactive
-            impact = min(inactive_estimate * 3, 75)
-            all_suggestions.append({
-                "type": "reengage",
-                "impact": impact,
-                "text": ui_get(content, "action_reengage", "💌 Re-engage Inactive Members\n{count} visitors haven't checked in this week").replace("{count}", str(inactive_estimate)),
-                "button": "btn_reengage_message"
-            })
-    
-    # 7. CELEBRATE RECENT WIN (High Impact if just achieved something)
-    recent_achievement = None
-    if stats["rank"] <= 10:
-        recent_achievement = f"#{stats['rank']} rank"
-    elif stats["visitors"] in [10, 25, 50, 100]:
-        recent_achievement = f"{stats['visitors']} visitors"
-    
-    if recent_achievement:
-        # Impact: High for celebrations (motivational)
-        impact = 80
-        all_suggestions.append({
-            "type": "celebrate",
-            "impact": impact,
-            "text": ui_get(content, "action_celebrate", "🎉 Celebrate Your Win!\nYou just reached {achievement} - share your success!").replace("{achievement}", recent_achievement),
-            "button": "btn_share_achievement"
-        })
-    
-    # 8. WEEKLY GOAL SETTING (Medium Impact - planning)
-    if stats["growth"]["has_time_data"]:
-        last_week_growth = stats["growth"]["members_7d"]
-        # Impact: Medium for goal setting
-        impact = 50
-        all_suggestions.append({
-            "type": "weekly_goal",
-            "impact": impact,
-            "text": ui_get(content, "action_weekly_goal", "🎯 Set This Week's Goal\nLast week: +{last_week} members. What's your goal this week?").replace("{last_week}", str(last_week_growth)),
-            "button": "btn_set_goal"
-        })
-    
-    # 9. BEST TIME TO SHARE (Low-Medium Impact - optimization)
-    # Simplified: assume 6-9 PM is best time
-    impact = 35
-    all_suggestions.append({
-        "type": "best_time",
-        "impact": impact,
-        "text": ui_get(content, "action_best_time", "⏰ Prime Sharing Time\nYour team is most active {time_range} - share then!").replace("{time_range}", "6-9 PM"),
-        "button": "btn_set_reminder"
-    })
-    
-    # SORT BY IMPACT AND TAKE TOP 3
-    all_suggestions.sort(key=lambda x: x["impact"], reverse=True)
-    top_suggestions = all_suggestions[:3]
+    for action_type, rule, text_key, text_default in ACTION_SUGGESTIONS:
+        result = rule(stats, avg_stats, content)
+        if result is not None:
+            all_suggestions.append((action_type, result[0], text_key, text_default, result[1]))
+    
+    # TAKE TOP 3 BY IMPACT (ties keep rule order)
+    top_suggestions = [
+        {"type": action_type, "text": fill_template(ui_get(content, text_key, text_default), **values)}
+        for action_type, _, text_key, text_default, values in heapq.nlargest(3, all_suggestions, key=lambda x: x[1])
+    ]
     
     # Build display
     sections = []
@@ -5423,13 +6008,13 @@ async def show_my_actions(query, context, content, user_id: int):
     
     for i, suggestion in enumerate(top_suggestions):
         if i > 0:
-            sections.append("━━━━━━━━━━━━━━━")
+            sections.append(SECTION_RULE)
         sections.append("")
         sections.append(suggestion["text"])
         sections.append("")
         actions_list.append(suggestion["type"])
     
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.append(SECTION_RULE)
     
     # If no suggestions somehow, show encouragement
     if not actions_list:
@@ -5447,22 +6032,17 @@ async def show_followup_template(query, context, content, ref_code: str):
     # Get invite link
     invite_link = build_invite_link(ref_code, content)
     
-    # Get team stats for personalization
-    team_stats = get_team_stats(ref_code)
+    # Get team stats for personalization (sqlite read, kept off the event loop)
+    team_stats = await asyncio.to_thread(get_cached_team_stats, ref_code)
     
     template_text = ui_get(content, "followup_template", "📧 FOLLOW-UP TEMPLATE")
-    template_text = template_text.replace("{count}", str(team_stats["team_with_links"]))
-    template_text = template_text.replace("{link}", invite_link)
+    template_text = fill_template(template_text, count=team_stats["team_with_links"], link=invite_link)
     
     await safe_show_menu_message(
         query,
         context,
         template_text,
-        InlineKeyboardMarkup([
-            [InlineKeyboardButton("📋 Copy Link", url=invite_link)],
-            [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:actions")],
-            [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-        ])
+        action_template_kb(content, invite_link)
     )
 
 
@@ -5472,16 +6052,13 @@ async def show_streak_reminder(query, context, content):
     days = 5  # Would get from database
     
     reminder_text = ui_get(content, "streak_reminder", "🔥 STREAK REMINDER")
-    reminder_text = reminder_text.replace("{days}", str(days))
+    reminder_text = fill_template(reminder_text, days=days)
     
     await safe_show_menu_message(
         query,
         context,
         reminder_text,
-        InlineKeyboardMarkup([
-            [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:actions")],
-            [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-        ])
+        action_detail_kb(content)
     )
 
 
@@ -5493,17 +6070,14 @@ async def show_conversion_tips(query, context, content):
         query,
         context,
         tips_text,
-        InlineKeyboardMarkup([
-            [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:actions")],
-            [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-        ])
+        action_detail_kb(content)
     )
 
 
 async def show_share_achievement(query, context, content, user_id: int):
     """Show pre-filled achievement share message."""
     # Get user stats to determine achievement
-    stats = get_personal_stats(user_id)
+    stats = await fetch_personal_stats(context, user_id)
     
     if not stats:
         await safe_show_menu_message(
@@ -5544,23 +6118,19 @@ async def show_share_achievement(query, context, content, user_id: int):
         "Building something special here! 💪"
     )
     
-    share_message = share_message.replace("{achievement}", achievement).replace("{link}", invite_link)
+    share_message = fill_template(share_message, achievement=achievement, link=invite_link)
     
     # Show the message
     header = ui_get(content, "share_achievement_header", "📣 SHARE YOUR ACHIEVEMENT")
     copy_instruction = ui_get(content, "share_achievement_copy", "📋 Copy and share this message:")
     
-    full_text = f"{header}\n━━━━━━━━━━━━━━━\n\n{copy_instruction}\n\n{share_message}"
+    full_text = f"{header}\n{SECTION_RULE}\n\n{copy_instruction}\n\n{share_message}"
     
     await safe_show_menu_message(
         query,
         context,
         full_text,
-        InlineKeyboardMarkup([
-            [InlineKeyboardButton(ui_get(content, "btn_view_share_templates", "💬 Use Share Templates Instead"), callback_data="share_tpl:choose")],
-            [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:actions")],
-            [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-        ])
+        share_achievement_kb(content)
     )
 
 
@@ -5569,28 +6139,70 @@ async def show_reengage_template(query, context, content, ref_code: str):
     # Get invite link
     invite_link = build_invite_link(ref_code, content)
     
-    # Get team stats for personalization
-    team_stats = get_team_stats(ref_code)
+    # Get team stats for personalization (sqlite read, kept off the event loop)
+    team_stats = await asyncio.to_thread(get_cached_team_stats, ref_code)
     
     template_text = ui_get(content, "reengage_template", "💌 RE-ENGAGEMENT TEMPLATE")
-    template_text = template_text.replace("{members}", str(team_stats["team_with_links"]))
-    template_text = template_text.replace("{link}", invite_link)
+    template_text = fill_template(template_text, members=team_stats["team_with_links"], link=invite_link)
     
     await safe_show_menu_message(
         query,
         context,
         template_text,
-        InlineKeyboardMarkup([
-            [InlineKeyboardButton("📋 Copy Link", url=invite_link)],
-            [InlineKeyboardButton(ui_get(content, "back_to_my_stats", "⬅️ Back to My Stats"), callback_data="mystats:actions")],
-            [InlineKeyboardButton(ui_get(content, "back_to_menu", "⬅️ Back to menu"), callback_data="menu:home")]
-        ])
+        action_template_kb(content, invite_link)
     )
 
 
+# Achievements in display order:
+# (stat, unlock threshold, show-as-locked threshold or None, ui key, unlocked default, locked title).
+# A stat of None is always unlocked; percentile is ranked lower-is-better.
+ACHIEVEMENTS = (
+    ("active_members", 1, None, "achievement_first_steps", "✅ First Steps - Made 1st referral", None),
+    ("active_members", 10, 5, "achievement_team_builder_10", "✅ Team Builder - 10 members", "Team Builder - 10 members"),
+    ("active_members", 25, 15, "achievement_team_builder_25", "✅ Growing Strong - 25 members", "Growing Strong - 25 members"),
+    ("active_members", 50, 35, "achievement_team_builder_50", "✅ Power Player - 50 members", "Power Player - 50 members"),
+    ("active_members", 100, 75, "achievement_century_club", "✅ Century Club - 100 members", "Century Club - 100 members"),
+    ("percentile", 50, None, "achievement_rising_star", "✅ Rising Star - Top 50%", None),
+    ("percentile", 25, 40, "achievement_top_quarter", "✅ Top Performer - Top 25%", "Top Performer - Top 25%"),
+    ("percentile", 10, 20, "achievement_elite_status", "✅ Elite Status - Top 10%", "Elite Status - Top 10%"),
+    ("streak", 7, None, "achievement_week_warrior", "✅ Week Warrior - 7-day streak", None),
+    ("streak", 30, None, "achievement_month_master", "✅ Month Master - 30-day streak", None),
+    ("conversion", 70, 50, "achievement_quality_focus", "✅ Quality Focus - 70%+ conversion", "Quality Focus - 70%+ conversion"),
+    ("conversion", 90, 75, "achievement_conversion_king", "✅ Conversion King - 90%+ conversion", "Conversion King - 90%+ conversion"),
+    ("visitors", 50, None, "achievement_wide_reach", "✅ Wide Reach - 50 visitors", None),
+    ("visitors", 100, None, "achievement_mass_attraction", "✅ Mass Attraction - 100 visitors", None),
+    ("visitors", 250, None, "achievement_marketing_master", "✅ Marketing Master - 250 visitors", None),
+    # Placeholders until join dates and weekly activity are tracked
+    (None, 0, None, "achievement_early_adopter", "✅ Early Adopter - Joined early 2026", None),
+    (None, 0, None, "achievement_consistent", "✅ Consistent - 3 weeks active", None),
+)
+
+
+def collect_achievements(stats: Dict[str, Any], content: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """("unlocked" | "locked", text) for every achievement reached or within reach."""
+    achievements = []
+    for stat, unlock_at, locked_from, text_key, unlocked_text, locked_title in ACHIEVEMENTS:
+        if stat is None:
+            achievements.append(("unlocked", ui_get(content, text_key, unlocked_text)))
+            continue
+        value = stats[stat]
+        if stat == "percentile":
+            if value <= unlock_at:
+                achievements.append(("unlocked", ui_get(content, text_key, unlocked_text)))
+            elif locked_from is not None and value <= locked_from:
+                achievements.append(("locked", f"🔒 {locked_title}"))
+        elif value >= unlock_at:
+            achievements.append(("unlocked", ui_get(content, text_key, unlocked_text)))
+        elif locked_from is not None and value >= locked_from:
+            progress = int((value / unlock_at) * 100)
+            locked_text = ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)")
+            achievements.append(("locked", fill_template(locked_text, title=locked_title, progress=progress)))
+    return achievements
+
+
 async def show_my_milestones(query, context, content, user_id: int):
     """Show My Milestones screen with next milestone, achievements, and recent wins."""
-    stats = get_personal_stats(user_id)
+    stats = await fetch_personal_stats(context, user_id)
     
     if not stats:
         await safe_show_menu_message(
@@ -5601,24 +6213,12 @@ async def show_my_milestones(query, context, content, user_id: int):
         )
         return
     
-    sections = []
-    
-    # Title
-    sections.append(ui_get(content, "my_milestones_title", "🎖️ MY MILESTONES"))
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
-    # Next Milestone Section
-    sections.append(ui_get(content, "next_milestone_section", "🎯 NEXT MILESTONE"))
-    sections.append("━━━━━━━━━━━━━━━")
+    # Title, then the Next Milestone Section
+    sections = [ui_get(content, "my_milestones_title", "🎖️ MY MILESTONES")]
+    sections.extend(stats_section(ui_get(content, "next_milestone_section", "🎯 NEXT MILESTONE")))
     
     # Find next milestone
-    milestones = [10, 25, 50, 100, 250, 500]
-    next_milestone = None
-    for ms in milestones:
-        if stats["active_members"] < ms:
-            next_milestone = ms
-            break
+    next_milestone = next_team_milestone(stats["active_members"])
     
     if next_milestone:
         current = stats["active_members"]
@@ -5636,169 +6236,48 @@ async def show_my_milestones(query, context, content, user_id: int):
             encouragement = ui_get(content, "milestone_keep_going", "Keep pushing! 🚀")
         
         milestone_display = ui_get(content, "milestone_display", "{title}\n\nCurrent: {current} ({percent}%)\n\nJust {remaining} more! {encouragement}")
-        milestone_display = milestone_display.replace("{title}", milestone_title)
-        milestone_display = milestone_display.replace("{current}", str(current))
-        milestone_display = milestone_display.replace("{percent}", str(percentage))
-        milestone_display = milestone_display.replace("{remaining}", str(remaining))
-        milestone_display = milestone_display.replace("{encouragement}", encouragement)
-        
-        sections.append(milestone_display)
-        sections.append("")
+        milestone_display = fill_template(milestone_display, title=milestone_title, current=current, percent=percentage, remaining=remaining, encouragement=encouragement)
         
-        # Progress bar with milestone context
+        # Milestone text, then a progress bar with milestone context
         progress_bar = create_progress_bar(percentage, context="milestone")
-        sections.append(progress_bar)
+        sections.extend((milestone_display, "", progress_bar))
     else:
         sections.append("🎉 You've reached all milestones! Amazing!")
     
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
-    
     # Achievements Section
-    unlocked_count = 0
     total_achievements = 18
+    achievements = collect_achievements(stats, content)
+    unlocked_count = sum(1 for status, _ in achievements if status == "unlocked")
     
-    # Check which achievements are unlocked
-    achievements = []
-    
-    # First Steps
-    if stats["active_members"] >= 1:
-        achievements.append(("unlocked", ui_get(content, "achievement_first_steps", "✅ First Steps - Made 1st referral")))
-        unlocked_count += 1
-    
-    # Team Builder milestones
-    if stats["active_members"] >= 10:
-        achievements.append(("unlocked", ui_get(content, "achievement_team_builder_10", "✅ Team Builder - 10 members")))
-        unlocked_count += 1
-    elif stats["active_members"] >= 5:
-        progress = int((stats["active_members"] / 10) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Team Builder - 10 members").replace("{progress}", str(progress))))
-    
-    if stats["active_members"] >= 25:
-        achievements.append(("unlocked", ui_get(content, "achievement_team_builder_25", "✅ Growing Strong - 25 members")))
-        unlocked_count += 1
-    elif stats["active_members"] >= 15:
-        progress = int((stats["active_members"] / 25) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Growing Strong - 25 members").replace("{progress}", str(progress))))
-    
-    if stats["active_members"] >= 50:
-        achievements.append(("unlocked", ui_get(content, "achievement_team_builder_50", "✅ Power Player - 50 members")))
-        unlocked_count += 1
-    elif stats["active_members"] >= 35:
-        progress = int((stats["active_members"] / 50) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Power Player - 50 members").replace("{progress}", str(progress))))
-    
-    if stats["active_members"] >= 100:
-        achievements.append(("unlocked", ui_get(content, "achievement_century_club", "✅ Century Club - 100 members")))
-        unlocked_count += 1
-    elif stats["active_members"] >= 75:
-        progress = int((stats["active_members"] / 100) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Century Club - 100 members").replace("{progress}", str(progress))))
-    
-    # Ranking achievements
-    if stats["percentile"] <= 50:
-        achievements.append(("unlocked", ui_get(content, "achievement_rising_star", "✅ Rising Star - Top 50%")))
-        unlocked_count += 1
-    
-    if stats["percentile"] <= 25:
-        achievements.append(("unlocked", ui_get(content, "achievement_top_quarter", "✅ Top Performer - Top 25%")))
-        unlocked_count += 1
-    elif stats["percentile"] <= 40:
-        achievements.append(("locked", "🔒 Top Performer - Top 25%"))
-    
-    if stats["percentile"] <= 10:
-        achievements.append(("unlocked", ui_get(content, "achievement_elite_status", "✅ Elite Status - Top 10%")))
-        unlocked_count += 1
-    elif stats["percentile"] <= 20:
-        achievements.append(("locked", "🔒 Elite Status - Top 10%"))
-    
-    # Streak achievements
-    if stats["streak"] >= 7:
-        achievements.append(("unlocked", ui_get(content, "achievement_week_warrior", "✅ Week Warrior - 7-day streak")))
-        unlocked_count += 1
-    
-    if stats["streak"] >= 30:
-        achievements.append(("unlocked", ui_get(content, "achievement_month_master", "✅ Month Master - 30-day streak")))
-        unlocked_count += 1
-    
-    # Conversion achievements
-    if stats["conversion"] >= 70:
-        achievements.append(("unlocked", ui_get(content, "achievement_quality_focus", "✅ Quality Focus - 70%+ conversion")))
-        unlocked_count += 1
-    elif stats["conversion"] >= 50:
-        progress = int((stats["conversion"] / 70) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Quality Focus - 70%+ conversion").replace("{progress}", str(progress))))
-    
-    if stats["conversion"] >= 90:
-        achievements.append(("unlocked", ui_get(content, "achievement_conversion_king", "✅ Conversion King - 90%+ conversion")))
-        unlocked_count += 1
-    elif stats["conversion"] >= 75:
-        progress = int((stats["conversion"] / 90) * 100)
-        achievements.append(("locked", ui_get(content, "locked_achievement", "🔒 {title} ({progress}%)").replace("{title}", "Conversion King - 90%+ conversion").replace("{progress}", str(progress))))
-    
-    # Visitor-based achievements (Marketing/Reach)
-    if stats["visitors"] >= 50:
-        achievements.append(("unlocked", ui_get(content, "achievement_wide_reach", "✅ Wide Reach - 50 visitors")))
-        unlocked_count += 1
-    
-    if stats["visitors"] >= 100:
-        achievements.append(("unlocked", ui_get(content, "achievement_mass_attraction", "✅ Mass Attraction - 100 visitors")))
-        unlocked_count += 1
-    
-    if stats["visitors"] >= 250:
-        achievements.append(("unlocked", ui_get(content, "achievement_marketing_master", "✅ Marketing Master - 250 visitors")))
-        unlocked_count += 1
-    
-    # Early adopter (placeholder - would check actual join date)
-    achievements.append(("unlocked", ui_get(content, "achievement_early_adopter", "✅ Early Adopter - Joined early 2026")))
-    unlocked_count += 1
-    
-    # Consistency achievements (placeholder)
-    achievements.append(("unlocked", ui_get(content, "achievement_consistent", "✅ Consistent - 3 weeks active")))
-    unlocked_count += 1
-    
-    sections.append(ui_get(content, "achievements_section", "🏅 ACHIEVEMENTS UNLOCKED ({unlocked}/{total})").replace("{unlocked}", str(unlocked_count)).replace("{total}", str(total_achievements)))
-    sections.append("━━━━━━━━━━━━━━━")
+    achievements_title = ui_get(content, "achievements_section", "🏅 ACHIEVEMENTS UNLOCKED ({unlocked}/{total})")
+    sections.extend(stats_section(fill_template(achievements_title, unlocked=unlocked_count, total=total_achievements)))
     
     # Show achievements (up to 11 total: 8 unlocked + 3 locked)
-    shown = 0
-    for status, achievement_text in achievements:
-        if shown >= 11:
-            break
-        sections.append(achievement_text)
-        shown += 1
-    
-    sections.append("")
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(achievement_text for _, achievement_text in achievements[:11])
     
     # Recent Wins Section
-    sections.append(ui_get(content, "recent_wins_section", "🎉 RECENT WINS"))
-    sections.append("━━━━━━━━━━━━━━━")
+    sections.extend(stats_section(ui_get(content, "recent_wins_section", "🎉 RECENT WINS")))
     
     # Generate recent wins based on stats
     wins = []
     
     if stats["active_members"] >= 25:
         win_text = ui_get(content, "win_reached_members", "✅ Reached {count} members ({time} ago)")
-        win_text = win_text.replace("{count}", str(stats["active_members"]))
-        win_text = win_text.replace("{time}", "recently")
+        win_text = fill_template(win_text, count=stats["active_members"], time="recently")
         wins.append(win_text)
     
     if stats["rank"] <= 50:
         win_text = ui_get(content, "win_climbed_rank", "✅ Climbed to #{rank} rank ({time} ago)")
-        win_text = win_text.replace("{rank}", str(stats["rank"]))
-        win_text = win_text.replace("{time}", "recently")
+        win_text = fill_template(win_text, rank=stats["rank"], time="recently")
         wins.append(win_text)
     
     if stats["streak"] >= 5:
         win_text = ui_get(content, "win_streak", "✅ {days}-day streak achieved ({time})")
-        win_text = win_text.replace("{days}", str(stats["streak"]))
-        win_text = win_text.replace("{time}", "today")
+        win_text = fill_template(win_text, days=stats["streak"], time="today")
         wins.append(win_text)
     
     if wins:
-        for win in wins[:3]:  # Show max 3 recent wins
-            sections.append(win)
+        sections.extend(wins[:3])  # Show max 3 recent wins
     else:
         sections.append(ui_get(content, "no_recent_wins", "Keep building to unlock wins! 🚀"))
     
@@ -5850,7 +6329,7 @@ async def show_share_template_options(query, context, content, user_id: int, sty
     
     style_name = style_names.get(style, style.title())
     
-    title = ui_get(content, "share_template_options_title", "{style} - Choose an Option").replace("{style}", style_name)
+    title = fill_template(ui_get(content, "share_template_options_title", "{style} - Choose an Option"), style=style_name)
     intro = ui_get(content, "share_template_options_intro", "Pick which version you like best:")
     
     full_text = f"{title}\n\n{intro}"
@@ -5883,7 +6362,7 @@ async def show_share_template_message(query, context, content, user_id: int, sty
     template = get_share_template(style, option, content)
     
     # Replace {LINK} placeholder
-    message = template.replace("{LINK}", invite_link)
+    message = fill_template(template, LINK=invite_link)
     
     # Show just the message, no header or instructions
     await safe_show_menu_message(
@@ -5907,6 +6386,15 @@ def create_progress_bar(percentage: int, length: int = 10, context: str = "defau
     - "success" = Mint/Aqua for high performance (60%+)
     - "milestone" = Mint if ≥80%, else Blue
     """
+    # Whole percentages at the default length come from the prebuilt table
+    if length == PROGRESS_BAR_LENGTH and type(percentage) is int and 0 <= percentage <= 100:
+        bars = _PROGRESS_BARS.get(context)
+        if bars is not None:
+            return bars[percentage]
+    return _render_progress_bar(percentage, length, context)
+
+
+def _render_progress_bar(percentage: int, length: int, context: str) -> str:
     filled = int((percentage / 100) * length)
     
     # Choose color based on context and value
@@ -5923,6 +6411,41 @@ def create_progress_bar(percentage: int, length: int = 10, context: str = "defau
     return f"{bar} {percentage}%"
 
 
+PROGRESS_BAR_LENGTH = 10
+_PROGRESS_BARS: Dict[str, Tuple[str, ...]] = {
+    context: tuple(_render_progress_bar(p, PROGRESS_BAR_LENGTH, context) for p in range(101))
+    for context in ("default", "success", "milestone")
+}
+
+
+# Callback handlers by callback_data prefix
+CALLBACK_ROUTES = {
+    "menu:": on_menu_click,
+    "ref:": on_ref_click,
+    "invite:": on_invite_click,
+    "affiliate:": on_affiliate_click,
+    "mystats:": on_mystats_click,
+    "action:": on_action_click,
+    "progress:": on_progress_click,
+    "share_tpl:": on_invite_click,
+    "share_opt:": on_invite_click,
+    "lang:set:": on_language_click,
+    "join:": on_join_click,
+    "faq_topic:": on_faq_click,
+    "faq_q:": on_faq_click,
+    "faq_back_": on_faq_click,
+    "faq_search:": on_faq_click,
+}
+CALLBACK_PREFIX_RE = re.compile("^(" + "|".join(re.escape(prefix) for prefix in CALLBACK_ROUTES) + ")")
+
+
+async def on_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send a button press to its handler with a single prefix match."""
+    match = CALLBACK_PREFIX_RE.match(update.callback_query.data or "")
+    if match:
+        await CALLBACK_ROUTES[match.group(1)](update, context)
+
+
 def main() -> None:
     token = (os.environ.get("TELEGRAM_BOT_TOKEN") or "").strip()
     if not token:
@@ -5943,19 +6466,7 @@ def main() -> None:
     app.add_handler(CommandHandler("reset", reset_cmd))
     app.add_handler(CommandHandler("resetuser", resetuser_cmd))
 
-    app.add_handler(CallbackQueryHandler(on_menu_click, pattern=r"^menu:"))
-
-    app.add_handler(CallbackQueryHandler(on_ref_click, pattern=r"^ref:"))
-    app.add_handler(CallbackQueryHandler(on_invite_click, pattern=r"^invite:"))
-    app.add_handler(CallbackQueryHandler(on_affiliate_click, pattern=r"^affiliate:"))
-    app.add_handler(CallbackQueryHandler(on_mystats_click, pattern=r"^mystats:"))
-    app.add_handler(CallbackQueryHandler(on_action_click, pattern=r"^action:"))
-    app.add_handler(CallbackQueryHandler(on_progress_click, pattern=r"^progress:"))
-    app.add_handler(CallbackQueryHandler(on_invite_click, pattern=r"^share_tpl:"))
-    app.add_handler(CallbackQueryHandler(on_invite_click, pattern=r"^share_opt:"))
-    app.add_handler(CallbackQueryHandler(on_language_click, pattern=r"^lang:set:"))
-    app.add_handler(CallbackQueryHandler(on_join_click, pattern=r"^join:"))
-    app.add_handler(CallbackQueryHandler(on_faq_click, pattern=r"^(faq_topic:|faq_q:|faq_back_|faq_search:)"))
+    app.add_handler(CallbackQueryHandler(on_callback_query, pattern=CALLBACK_PREFIX_RE))
 
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text_message))
 
@@ -5965,10 +6476,9 @@ def main() -> None:
     job_queue = app.job_queue
     if job_queue:
         # Schedule daily report
-        from datetime import time
         job_queue.run_daily(
             send_daily_report,
-            time=time(hour=report_hour, minute=0, second=0),
+            time=clock_time(hour=report_hour, minute=0, second=0),
             name="daily_report"
         )
         logger.info(f"Daily report scheduled for {report_hour:02d}:00 UTC")